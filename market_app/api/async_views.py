@@ -0,0 +1,80 @@
+from django.http import HttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .pagination import IdCursorPagination
+from .renderers import FastJSONRenderer
+from .serializers import MarketSerializer, ProductSerializer, SellerSerializer, requested_expand
+from .views import market_queryset, seller_queryset
+from market_app.models import Product
+
+
+# Async-Varianten der Listen- und Detail-Views (Django async views + async ORM).
+# Unter ASGI (supermarket/asgi.py) wartet der Request auf die Datenbank, ohne einen Worker-Thread zu blockieren.
+# Listen werden per "?after=<id>" seitenweise ausgeliefert (Keyset wie bei IdCursorPagination), "?count=1" liefert zusätzlich die Gesamtanzahl.
+
+ASYNC_CHUNK_SIZE = 100      # so viele Objekte holt aiterator() pro Abfrage (und prefetch_related pro Stück)
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def parse_int(request, name, default, minimum=0, maximum=None):
+    value = int(request.GET.get(name, default))     # ValueError wird in list_response abgefangen
+    if value < minimum:
+        raise ValueError(name)
+    return min(value, maximum) if maximum else value
+
+
+async def list_response(request, queryset, serializer_class):
+    try:
+        after = parse_int(request, 'after', 0)
+        page_size = parse_int(request, 'page_size', api_settings.PAGE_SIZE, 1, IdCursorPagination.max_page_size)
+    except ValueError:
+        return json_response({'detail': 'Ungültiger Wert für after/page_size.'}, status=400)
+
+    page = queryset.filter(id__gt=after).order_by('id')[:page_size + 1]     # ein Objekt mehr, um zu wissen ob es eine nächste Seite gibt
+    objects = [obj async for obj in page.aiterator(chunk_size=ASYNC_CHUNK_SIZE)]
+    has_next = len(objects) > page_size
+    objects = objects[:page_size]
+
+    data = {
+        'next': replace_query_param(request.build_absolute_uri(), 'after', objects[-1].id) if has_next else None,
+        'results': serializer_class(objects, many=True, context={'request': request}).data,
+    }
+    if request.GET.get('count'):
+        data['count'] = await queryset.acount()
+    return json_response(data)
+
+
+async def detail_response(request, queryset, pk, serializer_class):
+    try:
+        obj = await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        return json_response({'detail': f'No {queryset.model._meta.object_name} matches the given query.'}, status=404)
+    return json_response(serializer_class(obj, context={'request': request}).data)
+
+
+async def markets_view(request):
+    return await list_response(request, market_queryset(requested_expand({'request': request})), MarketSerializer)
+
+
+async def market_single_view(request, pk):
+    return await detail_response(request, market_queryset(requested_expand({'request': request})), pk, MarketSerializer)
+
+
+async def sellers_view(request):
+    return await list_response(request, seller_queryset(), SellerSerializer)
+
+
+async def seller_single_view(request, pk):
+    return await detail_response(request, seller_queryset(), pk, SellerSerializer)
+
+
+async def products_view(request):
+    return await list_response(request, Product.objects.all(), ProductSerializer)
+
+
+async def product_single_view(request, pk):
+    return await detail_response(request, Product.objects.all(), pk, ProductSerializer)
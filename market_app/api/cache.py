@@ -0,0 +1,69 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# Cache für die serialisierten Daten einzelner Objekte (Market, Seller, Product).
+# Jedes Objekt hat eine "Generation" (zufälliger Wert): beim Ändern wird nur eine neue Generation gesetzt,
+# damit sind alle alten Einträge (egal welche Variante, z.B. anderer Host) automatisch ungültig.
+# Die Generation wird nur im Cache des Prozesses geändert, der gespeichert hat (LocMem ist pro Prozess!). Damit andere
+# Worker keine alten Daten ausliefern, gehört zusätzlich "updated_at" des Objekts zum Schlüssel (derselbe Wert wie im ETag).
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]    # funktioniert mit LocMem-, File- und Database-Cache
+
+
+def generation_key(model, pk):
+    return f'market_app:{model._meta.model_name}:{pk}:generation'
+
+
+def invalidate(model, pks):     # macht alle gecachten Daten der Objekte ungültig (wird von den Signals in market_app/signals.py aufgerufen)
+    keys = {generation_key(model, pk): uuid4().hex for pk in pks}
+    if keys:
+        get_cache().set_many(keys, timeout=None)
+
+
+def get_generation(cache, model, pk):
+    key = generation_key(model, pk)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid4().hex, timeout=None)   # add: überschreibt keine Generation, die gerade von einem anderen Request gesetzt wurde
+        generation = cache.get(key)
+    return generation
+
+
+def plain(data):    # wandelt ReturnDict/ReturnList/Hyperlink in einfache dict/list/str um (damit sich die Daten klein pickeln lassen)
+    if isinstance(data, dict):
+        return {key: plain(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [plain(value) for value in data]
+    if isinstance(data, str):
+        return str(data)
+    return data
+
+
+class CachedRetrieveMixin:      # für Views mit retrieve(): die Antwort wird pro Objekt (model + pk) gecacht
+
+    def retrieve(self, request, *args, **kwargs):
+        cache = get_cache()
+        model = self.get_queryset().model
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        updated_at = getattr(self, 'updated_at', None)      # von ConditionalRetrieveMixin bereits gelesen
+        if updated_at is None:
+            updated_at = model._default_manager.filter(pk=pk).values_list('updated_at', flat=True).first()
+        variant = md5(request.build_absolute_uri().encode()).hexdigest()    # Hyperlinks hängen vom Host ab, ?fields= usw. vom Query-String
+        key = f'market_app:{model._meta.model_name}:{pk}:{get_generation(cache, model, pk)}:{updated_at and updated_at.timestamp()}:{variant}'
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, plain(response.data), getattr(settings, 'API_CACHE_TIMEOUT', 300))
+        return response
@@ -0,0 +1,52 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from market_app.models import Change
+
+
+# Conditional GET: der Client schickt If-None-Match (ETag) bzw. If-Modified-Since mit und bekommt 304 (ohne Body) zurück,
+# wenn sich nichts geändert hat. Dafür reicht eine kleine Abfrage auf "updated_at" bzw. das Änderungsprotokoll (ohne zu serialisieren).
+
+
+def make_etag(request, *state):     # der ETag hängt vom Stand der Daten UND von der Anfrage ab (Host, Query-String, Format)
+    parts = [request.build_absolute_uri(), getattr(request, 'accepted_media_type', '')] + [str(value) for value in state]
+    return quote_etag(md5('|'.join(parts).encode()).hexdigest())
+
+
+def conditional_response(request, etag, updated_at, get_response):
+    last_modified = int(updated_at.timestamp()) if updated_at else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)   # 304 bzw. 412, wenn der Client schon aktuell ist
+    if response is None:
+        response = get_response()
+    if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def last_change():      # (seq, created_at) des letzten Eintrags im Änderungsprotokoll (market_app/changes.py): eine Abfrage über den Primärschlüssel
+    return Change.objects.order_by('-seq').values_list('seq', 'created_at').first() or (0, None)
+
+
+class ConditionalListMixin:     # für List-Views: der ETag hängt von der letzten seq im Änderungsprotokoll ab (konstante Kosten, unabhängig von der Größe der Liste)
+
+    def list(self, request, *args, **kwargs):     # jede Änderung (auch an anderen Tabellen) ändert den ETag: lieber einmal zu oft neu laden als veraltete Daten
+        seq, changed_at = last_change()
+        etag = make_etag(request, seq)
+        return conditional_response(request, etag, changed_at, lambda: super(ConditionalListMixin, self).list(request, *args, **kwargs))
+
+
+class ConditionalRetrieveMixin:     # für Detail-Views: es wird nur "updated_at" des Objekts abgefragt
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        model = self.get_queryset().model
+        updated_at = model._default_manager.filter(pk=pk).values_list('updated_at', flat=True).first()     # ohne annotate/prefetch des View-querysets
+        if updated_at is None:      # Objekt nicht vorhanden -> normale 404-Antwort
+            return super().retrieve(request, *args, **kwargs)
+        self.updated_at = updated_at        # auch für den Schlüssel von CachedRetrieveMixin
+        etag = make_etag(request, pk, updated_at)
+        return conditional_response(request, etag, updated_at, lambda: super(ConditionalRetrieveMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,179 @@
+import asyncio
+import contextvars
+import logging
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .async_views import json_response
+from .renderers import FastJSONRenderer
+from market_app import changes
+from market_app.models import Market, Product
+
+
+# Server-Sent Events unter /api/events/ (nur unter ASGI, z.B. uvicorn supermarket.asgi:application):
+# EIN Task pro Prozess (Hub) liest alle CHANGE_EVENTS_POLL_INTERVAL Sekunden das Änderungsprotokoll (market_app/changes.py)
+# und verteilt jedes Event (einmal als bytes erzeugt) an die Warteschlangen aller verbundenen Clients.
+# Ein wartender Client kostet nur einen Generator und eine asyncio.Queue (kein Thread, keine Datenbank-Abfrage).
+# ?market=1,2 liefert nur Events dieser Markets (gelöschte Products haben keinen Market mehr und gehen an alle),
+# Last-Event-ID (bzw. ?since=<seq>) liefert zuerst die verpassten Änderungen aus dem Änderungsprotokoll.
+
+logger = logging.getLogger('market_app.events')
+RETRY_MS = 3000         # so lange wartet der Browser (EventSource) vor dem erneuten Verbinden
+renderer = FastJSONRenderer()
+
+
+class Event:
+
+    def __init__(self, seq, name, market_id, data):
+        self.market_id = market_id      # None = für alle Clients
+        self.data = f'id: {seq}\nevent: {name}\ndata: '.encode() + renderer.render(data) + b'\n\n'
+
+
+async def load_events(rows):        # Einträge des Änderungsprotokolls -> Events mit dem aktuellen Stand (eine Abfrage pro Model)
+    last = {(row['model'], row['object_id']): row for row in rows}     # pro Objekt reicht die letzte Änderung
+    rows = [row for row in rows if last[(row['model'], row['object_id'])] is row]
+    ids = {model: {row['object_id'] for row in rows if row['model'] == model and row['op'] != 'delete'} for model in ('market', 'product')}
+    products = {row['id']: row async for row in Product.objects.filter(id__in=ids['product']).values('id', 'market_id', 'price')} if ids['product'] else {}
+    markets = {row['id']: row async for row in Market.objects.filter(id__in=ids['market']).values('id', 'name', 'location', 'net_worth')} if ids['market'] else {}
+
+    events = []
+    for row in rows:
+        model, pk, op = row['model'], row['object_id'], row['op']
+        if op == 'delete' and model in ('market', 'product'):
+            events.append(Event(row['seq'], model, pk if model == 'market' else None, {'op': op, 'id': pk}))
+        elif model == 'product' and pk in products:
+            product = products[pk]
+            events.append(Event(row['seq'], model, product['market_id'], {'op': op, 'id': pk, 'market': product['market_id'], 'price': str(product['price'])}))
+        elif model == 'market' and pk in markets:
+            market = markets[pk]
+            events.append(Event(row['seq'], model, pk, {'op': op, **market, 'net_worth': str(market['net_worth'])}))
+    return events
+
+
+class Subscriber:
+
+    def __init__(self, markets):
+        self.markets = markets      # Set von Market-ids oder None (alle)
+        self.queue = asyncio.Queue(maxsize=settings.CHANGE_EVENTS_QUEUE_SIZE)
+
+    def accepts(self, event):
+        return self.markets is None or event.market_id is None or event.market_id in self.markets
+
+    def push(self, data):       # False = Client ist zu langsam und wird getrennt
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+
+class Hub:      # läuft nur, solange Clients verbunden sind
+
+    def __init__(self):
+        self.subscribers = set()
+        self.seq = 0        # bis hierhin wurde das Änderungsprotokoll gelesen
+        self.task = None
+        self.loop = None
+
+    def running(self):
+        return self.task is not None and not self.task.done() and self.loop is asyncio.get_running_loop()
+
+    async def subscribe(self, markets):     # gibt (Subscriber, seq) zurück: alle Änderungen nach seq kommen über die Queue
+        if not self.running():
+            seq = await changes.alast_seq()
+            if not self.running():      # während des await kann ein anderer Client den Task bereits gestartet haben
+                self.loop, self.seq, self.subscribers = asyncio.get_running_loop(), seq, set()
+                # in einem leeren Kontext starten: create_task() kopiert sonst die ContextVars dieses Requests (z.B. den QueryRecorder
+                # von market_app/middleware.py), der Task würde noch nach dem Request dessen Abfragen aufzeichnen und ihn am Leben halten
+                self.task = contextvars.Context().run(self.loop.create_task, self.run())
+        subscriber = Subscriber(markets)
+        self.subscribers.add(subscriber)
+        return subscriber, self.seq
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def run(self):
+        while self.subscribers:
+            await asyncio.sleep(settings.CHANGE_EVENTS_POLL_INTERVAL)
+            try:
+                rows = await changes.afetch(self.seq)
+                while rows:
+                    self.publish(await load_events(rows))
+                    self.seq = rows[-1]['seq']
+                    rows = await changes.afetch(self.seq) if len(rows) == changes.BATCH_SIZE else []
+            except Exception:       # z.B. Datenbank gesperrt: beim nächsten Durchlauf erneut versuchen
+                logger.exception('Änderungsprotokoll konnte nicht gelesen werden')
+
+    def publish(self, events):
+        for event in events:
+            for subscriber in list(self.subscribers):
+                if subscriber.accepts(event) and not subscriber.push(event.data):
+                    self.subscribers.discard(subscriber)
+
+
+hub = Hub()
+
+
+class EventStream:      # async Iterator mit close(): Django ruft response.close() am Ende des Requests auf, auch wenn der Client die Verbindung trennt
+
+    def __init__(self, markets, since):
+        self.subscriber = None
+        self.iterator = self.events(markets, since)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.iterator.__anext__()
+
+    def close(self):
+        if self.subscriber is not None:
+            hub.unsubscribe(self.subscriber)
+
+    async def events(self, markets, since):
+        self.subscriber, seq = await hub.subscribe(markets)
+        subscriber = self.subscriber
+        try:
+            yield f'retry: {RETRY_MS}\n\n'.encode()
+            if since is not None and since < seq:       # verpasste Änderungen nachliefern (alles nach seq kommt über die Queue)
+                if since < await changes.afloor():
+                    yield Event(seq, 'reset', None, {'last_seq': seq}).data     # zu alt: der Client muss komplett neu laden
+                else:
+                    rows = await changes.afetch(since, seq)
+                    while rows:
+                        for event in await load_events(rows):
+                            if subscriber.accepts(event):
+                                yield event.data
+                        rows = await changes.afetch(rows[-1]['seq'], seq) if len(rows) == changes.BATCH_SIZE else []
+            while True:
+                try:
+                    data = await asyncio.wait_for(subscriber.queue.get(), settings.CHANGE_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:       # bis Python 3.10 nicht dasselbe wie das eingebaute TimeoutError
+                    yield b': keepalive\n\n'
+                    continue
+                if data is None:        # zu langsam: Verbindung beenden, der Client verbindet sich mit Last-Event-ID neu
+                    return
+                yield data
+        finally:
+            hub.unsubscribe(subscriber)
+
+
+async def events_view(request):     # /api/events/?market=1,2 (text/event-stream)
+    if not isinstance(request, ASGIRequest):
+        return json_response({'detail': 'Server-Sent Events sind nur unter ASGI verfügbar (supermarket/asgi.py).'}, status=501)
+    try:
+        markets = {int(value) for value in request.GET['market'].split(',')} if request.GET.get('market') else None
+        since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+        since = int(since) if since else None
+    except ValueError:
+        return json_response({'detail': 'Ungültiger Wert für market/since.'}, status=400)
+    response = StreamingHttpResponse(EventStream(markets, since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'        # nginx: Events nicht puffern
+    return response
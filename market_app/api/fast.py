@@ -0,0 +1,77 @@
+from operator import itemgetter
+
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from .serializers import ProductHyperlinkedSerializer, ProductSerializer
+
+
+# Schneller, nur lesender Serializer für Listen von Products: baut die Ausgabe direkt aus den Dictionaries von .values(),
+# ohne die Feld-Objekte von DRF (to_representation pro Feld) und ohne reverse() pro Hyperlink.
+# Die Ausgabe ist identisch mit ProductSerializer bzw. ProductHyperlinkedSerializer (siehe Test und "manage.py bench_serializers").
+
+URL_PLACEHOLDER = 987654321     # wird einmal in die URL eingesetzt und danach durch die echte pk ersetzt
+
+
+def url_template(view_name, request):   # 'http://host/api/products/987654321/' -> ('http://host/api/products/', '/')
+    url = reverse(view_name, kwargs={'pk': URL_PLACEHOLDER}, request=request)
+    prefix, suffix = url.split(str(URL_PLACEHOLDER))
+    return prefix, suffix
+
+
+class FastProductSerializer:
+    field_names = ProductSerializer.Meta.fields
+    field_columns = {'url': 'id', 'market': 'market_id', 'seller': 'seller_id'}     # Feld -> Spalte für .values() (sonst gleicher Name)
+
+    def __init__(self, fields=None, exclude=None):
+        self.fields = [name for name in self.field_names if (fields is None or name in fields) and name not in (exclude or [])]
+        self.columns = {'id'} | {self.field_columns.get(name, name) for name in self.fields}     # nur die benötigten Spalten laden
+
+    def to_representation(self, rows):
+        format_decimal = '{:f}'.format      # wie DecimalField.to_representation (der Wert kommt von der Datenbank schon mit 2 Nachkommastellen)
+        build = {
+            'id': itemgetter('id'),
+            'name': itemgetter('name'),
+            'description': itemgetter('description'),
+            'price': lambda row: format_decimal(row['price']),
+            'market': itemgetter('market_id'),
+            'seller': itemgetter('seller_id'),
+        }
+        build.update(self.extra_fields())
+        getters = [(name, build[name]) for name in self.fields]
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+    def extra_fields(self):
+        return {}
+
+
+class FastProductHyperlinkedSerializer(FastProductSerializer):     # wie ProductHyperlinkedSerializer (url, market und seller als Links)
+    field_names = ProductHyperlinkedSerializer.Meta.fields
+
+    def __init__(self, request, fields=None, exclude=None):
+        super().__init__(fields, exclude)
+        self.request = request
+
+    def extra_fields(self):
+        product_prefix, product_suffix = url_template('product-detail', self.request)   # nur EINMAL reverse() pro Liste
+        market_prefix, market_suffix = url_template('market-detail', self.request)
+        seller_prefix, seller_suffix = url_template('seller-detail', self.request)
+        return {
+            'url': lambda row: f'{product_prefix}{row["id"]}{product_suffix}',
+            'market': lambda row: f'{market_prefix}{row["market_id"]}{market_suffix}',
+            'seller': lambda row: f'{seller_prefix}{row["seller_id"]}{seller_suffix}',
+        }
+
+
+class FastListMixin:    # für den ProductViewSet: list() liest nur die benötigten Spalten per .values() und serialisiert mit FastProductSerializer
+
+    def list(self, request, *args, **kwargs):
+        fields, exclude = self.sparse_fields()
+        serializer = FastProductSerializer(fields, exclude)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = {name.lstrip('-') for name in queryset.query.order_by}     # die Cursor-Pagination braucht die Werte der Sortier-Felder
+        queryset = queryset.values(*(serializer.columns | ordering))
+        page = self.paginate_queryset(queryset)     # die Cursor-Pagination funktioniert auch mit Dictionaries
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(queryset))
@@ -0,0 +1,38 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import filters, serializers
+
+
+class ProductFilter(filters.BaseFilterBackend):     # Filter für /api/products/ (?market=, ?seller=, ?min_price=, ?max_price=, ?name_prefix=)
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if 'market' in params:
+            queryset = queryset.filter(market_id=self.parse(params, 'market', int))      # nutzt den Index (market_id, price)
+        if 'seller' in params:
+            queryset = queryset.filter(seller_id=self.parse(params, 'seller', int))      # nutzt den Index (seller_id, price)
+        if 'min_price' in params:
+            queryset = queryset.filter(price__gte=self.parse(params, 'min_price', Decimal))
+        if 'max_price' in params:
+            queryset = queryset.filter(price__lte=self.parse(params, 'max_price', Decimal))
+        if params.get('name_prefix'):
+            prefix = params['name_prefix']
+            # als Bereich statt startswith: LIKE ist in SQLite case-insensitive und kann den Index auf "name" nicht nutzen (Suche ist daher case-sensitive!)
+            queryset = queryset.filter(name__gte=prefix, name__lt=prefix + '\U0010ffff')
+        return queryset
+
+    def parse(self, params, name, convert):
+        try:
+            return convert(params[name])
+        except (ValueError, InvalidOperation):
+            raise serializers.ValidationError({name: ['Ungültiger Wert.']})
+
+
+class OrderingFilter(filters.OrderingFilter):   # ?ordering=price, -price, name, -name (wird auch von der Cursor-Pagination verwendet)
+    ordering_fields = ['id', 'price', 'name']
+
+    def get_ordering(self, request, queryset, view):    # gleiche Preise/ Namen zusätzlich nach id sortieren: eindeutige Reihenfolge und Cursor ohne OFFSET
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not any(order.lstrip('-') in ('id', 'pk') for order in ordering):
+            ordering = [*ordering, '-id' if ordering[-1].startswith('-') else 'id']      # die Indizes (price) und (name) enthalten die id (rowid) bereits
+        return ordering
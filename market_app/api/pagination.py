@@ -0,0 +1,69 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class IdCursorPagination(CursorPagination):     # Keyset-Pagination über die id (WHERE id > cursor LIMIT n) -> jede Seite kostet gleich viel, egal wie weit hinten!
+    ordering = 'id'                     # muss ein eindeutiges und unveränderliches Feld sein
+    # die Standard-Größe einer Seite kommt aus den Settings (REST_FRAMEWORK['PAGE_SIZE'])
+    page_size_query_param = 'page_size' # der Client kann die Größe mit ?page_size= anpassen ...
+    max_page_size = 500                 # ... aber nie über dieses Maximum hinaus!
+
+    # Bei ?ordering=price hängt der OrderingFilter die id an (price, id). DRF merkt sich im Cursor nur den Wert des ersten Feldes
+    # und überspringt gleiche Preise per OFFSET (wird bei vielen gleichen Werten wieder so langsam wie OFFSET-Pagination).
+    # Hier enthält die Position die Werte ALLER Sortier-Felder: WHERE price >= p AND (price > p OR id > i) -> immer eindeutig, kein OFFSET.
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [str(instance[name] if isinstance(instance, dict) else getattr(instance, name)) for name in (order.lstrip('-') for order in ordering)]
+        return values[0] if len(values) == 1 else json.dumps(values)
+
+    def keyset_filter(self, position, reverse):     # alle Zeilen NACH position (in Richtung der Sortierung bzw. davor bei reverse)
+        values = [position] if len(self.ordering) == 1 else json.loads(position)
+        after, equal = Q(), Q()
+        for order, value in zip(self.ordering, values):
+            attr = order.lstrip('-')
+            lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+            after |= equal & Q(**{f'{attr}__{lookup}': value})
+            equal &= Q(**{attr: value})
+        first = self.ordering[0].lstrip('-')
+        first_lookup = 'lte' if reverse != self.ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{first}__{first_lookup}': values[0]}) & after     # die Bedingung auf dem ersten Feld allein kann den Index nutzen
+
+    def paginate_queryset(self, queryset, request, view=None):      # wie CursorPagination.paginate_queryset, aber mit keyset_filter() statt nur dem ersten Feld
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor if self.cursor is not None else (0, False, None)
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self.keyset_filter(current_position, reverse))
+            except (ValueError, TypeError, ValidationError):     # z.B. Cursor einer anderen Sortierung
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[offset:offset + self.page_size + 1])      # ein Objekt mehr, um zu wissen ob es eine nächste Seite gibt
+        self.page = results[:self.page_size]
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
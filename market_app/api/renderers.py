@@ -0,0 +1,25 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson   # optional: deutlich schneller als das json-Modul der Standardbibliothek
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):   # wie JSONRenderer, aber mit orjson (falls installiert) -> gleiche Ausgabe, nur schneller
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:   # z.B. Accept: application/json; indent=4
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,   # Decimal, datetime, Promise usw. genauso wie der JSONEncoder von DRF
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:       # z.B. Integer mit mehr als 64 Bit
+            return super().render(data, accepted_media_type, renderer_context)
+        # wie JSONRenderer: \u2028 und \u2029 immer escapen (gültiges JavaScript)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
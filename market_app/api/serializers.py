@@ -1,5 +1,19 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Value
+from django.utils import timezone
 from rest_framework import serializers
-from market_app.models import Market, Seller, Product
+from rest_framework.reverse import reverse
+from market_app.models import Market, MarketStats, Seller, Product
+from market_app.signals import invalidate_on_commit, memberships_changed
+from market_app import changes, stats
+
+
+BULK_MAX_ROWS = 10000       # maximale Anzahl an Zeilen pro Bulk-Request
+BULK_BATCH_SIZE = 500       # so viele Zeilen werden pro INSERT/UPDATE-Statement geschrieben
+SELLER_PREVIEW_SIZE = 5     # so viele Seller-Links zeigt ein Market ohne ?expand=sellers an
 
 
 def validate_no_x(value):     # allgemeine Validierungsfunktion für "value" (wird in der Regel in eine eigene Datei geschrieben!)
@@ -13,12 +27,62 @@ def validate_no_x(value):     # allgemeine Validierungsfunktion für "value" (wi
         return value
 
 
-class MarketSerializer(serializers.ModelSerializer):
-    sellers = serializers.HyperlinkedRelatedField(many=True, read_only=True, view_name='seller-detail')     # view_name verweist auf den Namen in der urls.py
+class DynamicFieldsMixin:       # für alle Serializer: mit den Argumenten 'fields' und 'exclude' werden nur bestimmte Felder ausgegeben (z.B. ?fields=id,name)
+
+    def __init__(self, *args, **kwargs):    # Funktion zum Überschreiben des 'fields' Attribut!
+    # Don't pass the 'fields' arg up to the superclass
+        fields = kwargs.pop('fields', None)     # wenn 'fields' nicht gefunden wird, ist None der default-Wert (fields wird z.B. in der views.py dem MarketHyperlinkedSerializer übergeben!)
+        exclude = kwargs.pop('exclude', None)   # die Felder, die NICHT ausgegeben werden sollen
+
+    # Instantiate the superclass normally
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+        # Drop any fields that are not specified in the `fields` argument.
+            allowed = set(fields)   # erstellt ein Set der fields (die dem Serializer übergeben worden sind!)
+            existing = set(self.fields)     # ein Set der bereits existierenden Felder
+            for field_name in existing - allowed:   # von der existierenden Felder werden die übergebenen Felder abgezogen/ entfernt (Resultat sind die nicht verwendeten Felder!)
+                self.fields.pop(field_name)     # die nicht verwendeten Felder werden aus den 'fields' entfernt! (somit bleiben nur noch die 'allowed' Felder übrig!)
+        for field_name in exclude or []:
+            self.fields.pop(field_name, None)
+
+
+def requested_expand(context):      # ?expand=sellers (DRF Request oder Django HttpRequest der async Views)
+    request = context.get('request')
+    if request is None:
+        return set()
+    params = getattr(request, 'query_params', request.GET)
+    return set(filter(None, params.get('expand', '').split(',')))
+
+
+class MarketSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    sellers = serializers.HyperlinkedRelatedField(many=True, read_only=True, view_name='seller-detail')     # alle Seller nur mit ?expand=sellers (ein Market kann sehr viele haben!)
+    seller_count = serializers.SerializerMethodField()
+    sellers_preview = serializers.SerializerMethodField()       # die ersten SELLER_PREVIEW_SIZE Seller
+    sellers_url = serializers.SerializerMethodField()           # Link zur seitenweisen Liste /api/market/<pk>/sellers/
     class Meta:
         model = Market          # referenziert auf das Model "Market"
         fields = '__all__'      # übernimmt alle Felder von dem Model "Market"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'sellers' not in requested_expand(self.context):
+            self.fields.pop('sellers', None)
+
+    def get_seller_count(self, obj):
+        if hasattr(obj, 'seller_count'):        # per annotate(Count('sellers')) berechnet (siehe MARKET_ANNOTATIONS in views.py)
+            return obj.seller_count
+        return obj.sellers.count()
+
+    def get_sellers_preview(self, obj):
+        sellers = getattr(obj, 'preview_sellers', None)     # per Prefetch mit Slice geladen (eine Abfrage für alle Markets)
+        if sellers is None:
+            sellers = obj.sellers.order_by('id')[:SELLER_PREVIEW_SIZE]
+        return [reverse('seller-detail', kwargs={'pk': seller.pk}, request=self.context.get('request')) for seller in sellers]
+
+    def get_sellers_url(self, obj):
+        return reverse('market-sellers', kwargs={'pk': obj.pk}, request=self.context.get('request'))
+
     # id = serializers.IntegerField(read_only=True)   # ist der pk (primary key) von unserer Datenbank (muss bei jedem Serializer vorhanden sein!)
     # name = serializers.CharField(max_length=255)      # die Validierung der Daten geschieht hier! (nicht mehr in den models!)
     # location = serializers.CharField(max_length=255, validators=[validate_no_x])    # validators ist die Validierungsfunktion
@@ -47,24 +111,11 @@ class MarketHyperlinkedSerializer(MarketSerializer, serializers.HyperlinkedModel
     class Meta:
         model = Market
         fields = ['id', 'url', 'name', 'location', 'description', 'net_worth']     # dieses hat nichts mit der parent-Klasse zu tun!
-    
-    def __init__(self, *args, **kwargs):    # Funktion zum Überschreiben des 'fields' Attribut!
-    # Don't pass the 'fields' arg up to the superclass
-        fields = kwargs.pop('fields', None)     # wenn 'fields' nicht gefunden wird, ist None der default-Wert (fields wird in der views.py dem MarketHyperlinkedSerializer übergeben!)
-
-    # Instantiate the superclass normally
-        super().__init__(*args, **kwargs)
-
-        if fields is not None:
-        # Drop any fields that are not specified in the `fields` argument.
-            allowed = set(fields)   # erstellt ein Set der fields (die dem Serializer übergeben worden sind!)
-            existing = set(self.fields)     # ein Set der bereits existierenden Felder
-            for field_name in existing - allowed:   # von der existierenden Felder werden die übergebenen Felder abgezogen/ entfernt (Resultat sind die nicht verwendeten Felder!)
-                self.fields.pop(field_name)     # die nicht verwendeten Felder werden aus den 'fields' entfernt! (somit bleiben nur noch die 'allowed' Felder übrig!)
+    # das Argument 'fields' (siehe markets_view) kommt vom DynamicFieldsMixin des MarketSerializer
 
 
 # für sellers:
-class SellerSerializer(serializers.ModelSerializer):
+class SellerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     markets = serializers.StringRelatedField(many=True, read_only=True)
     market_ids = serializers.PrimaryKeyRelatedField(            # Liste von IDs (pk)
         queryset=Market.objects.all(),                          # definieren von wo die pk her sind
@@ -79,8 +130,16 @@ class SellerSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'market_count', 'markets', 'contact_info', 'market_ids']    # "market_ids" ist zwar nur ein write_only Feld aber es muss trotzdem mit aufgenommen werden!
 
     def get_market_count(self, obj):                            # Methode für das SerializerMethodField "market_count"
+        if hasattr(obj, 'market_count'):                        # wurde im queryset per annotate(Count('markets')) bereits berechnet (keine extra Abfrage pro Seller!)
+            return obj.market_count
         return obj.markets.count()
 
+    def update(self, instance, validated_data):
+        with changes.batched():     # save() und das Setzen der Markets (m2m_changed) zusammen in einem INSERT ins Änderungsprotokoll
+            instance = super().update(instance, validated_data)
+        instance.__dict__.pop('market_count', None)             # annotierter Wert ist nach dem Ändern der Markets veraltet!
+        return instance
+
 # {  Testdaten für POST:
 #     "market_ids": [2, 5],
 #     "name": "Seller ModelSerializer",
@@ -94,6 +153,64 @@ class SellerListSerializer(SellerSerializer, serializers.HyperlinkedModelSeriali
         fields = ['url', 'id', 'name', 'market_count', 'contact_info', 'market_ids']
 
 
+
+class SellerMembershipSerializer(serializers.Serializer):     # für PUT /api/sellers/markets/: {"<seller_id>": [market_ids], ...} ersetzt die Markets vieler Seller auf einmal
+
+    def to_internal_value(self, data):
+        if not isinstance(data, dict):
+            raise serializers.ValidationError({'non_field_errors': ['Erwartet ein Dictionary {seller_id: [market_ids]}.']})
+        if len(data) > BULK_MAX_ROWS:
+            raise serializers.ValidationError({'non_field_errors': [f'Maximal {BULK_MAX_ROWS} Seller pro Request.']})
+        memberships, errors = {}, {}
+        for key, market_ids in data.items():
+            if not str(key).isdigit():
+                errors[key] = ['Ungültige Seller-id.']
+            elif not isinstance(market_ids, list) or not all(type(pk) is int for pk in market_ids):
+                errors[key] = ['Erwartet eine Liste von Market-ids.']
+            else:
+                memberships[int(key)] = set(market_ids)
+
+        seller_ids = set(Seller.objects.filter(id__in=memberships).values_list('id', flat=True))       # je EINE Abfrage für alle Seller und alle Markets
+        market_ids = set(Market.objects.filter(id__in=set().union(*memberships.values())).values_list('id', flat=True))
+        for seller_id, ids in memberships.items():
+            if seller_id not in seller_ids:
+                errors[str(seller_id)] = ['Seller nicht vorhanden!']
+            elif ids - market_ids:
+                errors[str(seller_id)] = [f'Market nicht vorhanden: {sorted(ids - market_ids)}']
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return memberships
+
+    def create(self, validated_data):       # vergleicht mit der Zwischentabelle und schreibt nur die Unterschiede (bulk_create + ein DELETE pro Batch)
+        through = Seller.markets.through
+        added, removed = [], []
+        seller_ids, market_ids = set(), set()       # für die eine gesammelte Benachrichtigung
+        with transaction.atomic():
+            existing = defaultdict(dict)        # seller_id -> {market_id: id der Zeile in der Zwischentabelle}
+            for pk, seller_id, market_id in through.objects.filter(seller_id__in=validated_data).values_list('id', 'seller_id', 'market_id'):
+                existing[seller_id][market_id] = pk
+            for seller_id, wanted in validated_data.items():
+                current = existing[seller_id]
+                to_add, to_remove = wanted - current.keys(), current.keys() - wanted
+                added.extend(through(seller_id=seller_id, market_id=market_id) for market_id in to_add)
+                removed.extend(current[market_id] for market_id in to_remove)
+                if to_add or to_remove:
+                    seller_ids.add(seller_id)
+                    market_ids.update(to_add, to_remove)
+
+            through.objects.bulk_create(added, batch_size=BULK_BATCH_SIZE)
+            for start in range(0, len(removed), BULK_BATCH_SIZE):
+                through.objects.filter(id__in=removed[start:start + BULK_BATCH_SIZE]).delete()
+            if seller_ids:
+                memberships_changed.send(sender=Seller, seller_ids=seller_ids, market_ids=market_ids)   # bulk_create/ delete lösen kein m2m_changed aus!
+        return {'added': len(added), 'removed': len(removed), 'sellers': len(seller_ids)}
+
+# {  Testdaten für PUT /api/sellers/markets/:
+#     "1": [2, 5],
+#     "3": []
+# }
+
 # class SellerDetailSerializer(serializers.Serializer):   # für GET-Methode (zum Anzeigen der Seller)
 #     id = serializers.IntegerField(read_only=True)
 #     name = serializers.CharField(max_length=255)
@@ -129,7 +246,7 @@ class SellerListSerializer(SellerSerializer, serializers.HyperlinkedModelSeriali
 
 
 # für products:
-class ProductSerializer(serializers.ModelSerializer):   # für single-view (GET)
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):   # für single-view (GET)
     # market = MarketSerializer(read_only=True)
     # seller = SellerSerializer(read_only=True)
     class Meta:
@@ -145,42 +262,164 @@ class ProductHyperlinkedSerializer(ProductSerializer, serializers.HyperlinkedMod
         fields = ['id', 'url', 'name', 'description', 'price', 'market', 'seller']
 
 
-class ProductCreateSerializer(serializers.ModelSerializer):     # für POST-Methode
-    market = serializers.CharField()
-    # market = serializers.PrimaryKeyRelatedField(queryset=Market.objects.all())
-    seller = serializers.CharField()
-    # seller = serializers.PrimaryKeyRelatedField(queryset=Market.objects.all())
+def existing_ids(market_ids, seller_ids):      # welche dieser Market- und Seller-ids gibt es? (beides mit EINER Abfrage per UNION)
+    parts = []
+    if market_ids:
+        parts.append(Market.objects.filter(id__in=market_ids).annotate(kind=Value('market')).values_list('kind', 'id').order_by())
+    if seller_ids:
+        parts.append(Seller.objects.filter(id__in=seller_ids).annotate(kind=Value('seller')).values_list('kind', 'id').order_by())
+    found = {'market': set(), 'seller': set()}
+    if parts:
+        for kind, pk in parts[0].union(*parts[1:], all=True):
+            found[kind].add(pk)
+    return found['market'], found['seller']
+
+
+class ProductCreateSerializer(DynamicFieldsMixin, serializers.ModelSerializer):     # für POST/PUT/PATCH: prüft market und seller mit einer Abfrage, schreibt direkt market_id/ seller_id
+    market = serializers.IntegerField(source='market_id')     # statt PrimaryKeyRelatedField (das lädt jedes Objekt einzeln per .get())
+    seller = serializers.IntegerField(source='seller_id')
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'price', 'market', 'seller']
 
-    def validate_market(self, value):
-        # Prüfe, ob ein Market mit dieser ID existiert
-        if not Market.objects.filter(id=value).exists():
-            raise serializers.ValidationError('Market nicht vorhanden!')
-        return value
-
-    def validate_seller(self, value):
-        # Prüfe, ob ein Seller mit dieser ID existiert
-        if not Seller.objects.filter(id=value).exists():
-            raise serializers.ValidationError('Seller nicht vorhanden!')
-        return value
-    
-    def create(self, validated_data):                   # für die POST-Methode
-        market_id = validated_data.pop('market')
-        seller_id = validated_data.pop('seller')
-        market = Market.objects.get(id=market_id)
-        seller = Seller.objects.get(id=seller_id)
-        product = Product.objects.create(market=market, seller=seller, **validated_data)
-        return product
-    
-    def update(self, instance, validated_data):         # für die PUT-Methode
-        instance.name = validated_data.get('name', instance.name)
-        instance.description = validated_data.get('description', instance.description)
-        instance.price = validated_data.get('price', instance.price)
-        instance.save()
+    def validate(self, attrs):
+        checks = {}     # nur ids prüfen, die neu sind (beim Ändern ist der bisherige Market/ Seller bereits gültig)
+        for name in ('market', 'seller'):
+            value = attrs.get(f'{name}_id')
+            if value is not None and value != getattr(self.instance, f'{name}_id', None):
+                checks[name] = value
+        if checks:
+            market_ids, seller_ids = existing_ids({checks['market']} if 'market' in checks else set(), {checks['seller']} if 'seller' in checks else set())
+            errors = {}
+            if 'market' in checks and checks['market'] not in market_ids:
+                errors['market'] = ['Market nicht vorhanden!']
+            if 'seller' in checks and checks['seller'] not in seller_ids:
+                errors['seller'] = ['Seller nicht vorhanden!']
+            if errors:
+                raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):                   # für die POST-Methode: ein INSERT ohne Market/ Seller vorher zu laden
+        return Product.objects.create(**validated_data)
+
+    def update(self, instance, validated_data):         # für die PUT/PATCH-Methode: nur geänderte Spalten (ohne Änderung kein UPDATE)
+        changed = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
+        if changed:
+            instance.save(update_fields=[*changed, 'updated_at'])      # updated_at (auto_now) für ETag/ Last-Modified
         return instance
 
+class ProductBulkListSerializer(serializers.ListSerializer):    # für viele Products auf einmal (prüft alle market/seller ids mit EINER Abfrage statt pro Zeile)
+
+    def to_internal_value(self, data):
+        rows = super().to_internal_value(data)      # prüft zuerst jede Zeile einzeln (ohne Datenbank-Abfragen)
+        errors = [{} for row in rows]
+
+        if self.instance is not None:       # beim Ändern (PUT/PATCH) muss jede Zeile eine vorhandene id haben
+            self.instance_map = self.instance.in_bulk([row['id'] for row in rows if 'id' in row])
+            for row, row_errors in zip(rows, errors):
+                if 'id' not in row:
+                    row_errors['id'] = ['Dieses Feld ist zum Ändern erforderlich.']
+                elif row['id'] not in self.instance_map:
+                    row_errors['id'] = ['Product nicht vorhanden!']
+
+        market_ids, seller_ids = existing_ids({row['market_id'] for row in rows if 'market_id' in row}, {row['seller_id'] for row in rows if 'seller_id' in row})
+        for row, row_errors in zip(rows, errors):
+            if 'market_id' in row and row['market_id'] not in market_ids:
+                row_errors['market'] = ['Market nicht vorhanden!']
+            if 'seller_id' in row and row['seller_id'] not in seller_ids:
+                row_errors['seller'] = ['Seller nicht vorhanden!']
+
+        if any(errors):
+            raise serializers.ValidationError(errors)   # Fehler pro Zeile (leeres Dictionary für gültige Zeilen)
+        return rows
+
+    def create(self, validated_data):       # für POST: alle Products mit wenigen INSERTs in einer Transaktion
+        products = []
+        for row in validated_data:
+            row.pop('id', None)
+            products.append(Product(**row))
+        with transaction.atomic():
+            products = Product.objects.bulk_create(products, batch_size=BULK_BATCH_SIZE)
+            stats.add_products((product.market_id, 1, product.price) for product in products)    # bulk_create löst keine Signals aus!
+            changes.record('create', Product, [product.pk for product in products])
+        return products
+
+    def update(self, instance, validated_data):     # für PUT/PATCH: nur die übergebenen Felder werden per bulk_update geschrieben
+        products = []
+        fields = set()
+        now = timezone.now()
+        market_ids = set()      # alte und neue Markets (deren Statistik muss neu berechnet werden)
+        for row in validated_data:
+            product = self.instance_map[row.pop('id')]
+            market_ids.add(product.market_id)
+            for attr, value in row.items():
+                setattr(product, attr, value)
+            fields.update(row)
+            product.updated_at = now        # bulk_update setzt auto_now-Felder nicht automatisch!
+            products.append(product)
+        if fields:
+            fields.add('updated_at')
+            with transaction.atomic():
+                Product.objects.bulk_update(products, fields, batch_size=BULK_BATCH_SIZE)
+                invalidate_on_commit(Product, [product.pk for product in products])    # bulk_update löst keine post_save Signals aus!
+                changes.record('update', Product, [product.pk for product in products])
+                if fields & {'market_id', 'price'}:
+                    stats.recompute_products(market_ids | {product.market_id for product in products})
+        return products
+
+
+class ProductBulkSerializer(serializers.ModelSerializer):       # eine Zeile eines Bulk-Requests (wird nur mit many=True verwendet!)
+    id = serializers.IntegerField(required=False)               # nur beim Ändern notwendig
+    market = serializers.IntegerField(source='market_id')       # nur die id (wird gesammelt im ProductBulkListSerializer geprüft)
+    seller = serializers.IntegerField(source='seller_id')
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'description', 'price', 'market', 'seller']
+        list_serializer_class = ProductBulkListSerializer
+
+
+class ProductBulkDeleteSerializer(serializers.Serializer):      # für DELETE: {"ids": [1, 2, 3]}
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ROWS)
+
+# Testdaten für Bulk - POST /api/products/bulk/:
+# [
+#     {"name": "Product1", "description": "Beschreibung_1", "price": 49.95, "market": 2, "seller": 1},
+#     {"name": "Product2", "description": "Beschreibung_2", "price": 9.95, "market": 2, "seller": 3}
+# ]
+
+
+# für die Statistik der Markets (wird in der Tabelle MarketStats gepflegt, siehe market_app/stats.py):
+class MarketStatsSerializer(serializers.ModelSerializer):
+    market = serializers.IntegerField(source='market_id')
+    total_price = serializers.DecimalField(source='price_total', max_digits=60, decimal_places=2)
+    average_price = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MarketStats
+        fields = ['market', 'product_count', 'seller_count', 'total_price', 'average_price', 'updated_at']
+
+    def get_average_price(self, obj):       # wird berechnet statt gespeichert (None, wenn der Market keine Products hat)
+        if not obj.product_count:
+            return None
+        return str((obj.price_total / obj.product_count).quantize(Decimal('0.01')))
+
+
+# für die Suche:
+class SearchQuerySerializer(serializers.Serializer):    # prüft die Query-Parameter von /api/search/
+    q = serializers.CharField()
+    type = serializers.ChoiceField(choices=['product', 'market'], required=False)
+    page_size = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    offset = serializers.IntegerField(min_value=0, max_value=10000, default=0)     # begrenzt, da jede Seite die Treffer davor mit sortieren muss
+
+
+class ChangeQuerySerializer(serializers.Serializer):    # prüft die Query-Parameter von /api/changes/
+    since = serializers.IntegerField(min_value=0, default=0)    # die letzte bereits bekannte seq (0 = alle)
+    output = serializers.ChoiceField(choices=['json', 'ndjson'], default='json')
+
+
 # class ProductDetailSerializer(serializers.Serializer):      # für GET-Methode (zum Anzeigen der Products)
 #     id = serializers.IntegerField(read_only=True)
 #     name = serializers.CharField(max_length=255)
@@ -0,0 +1,43 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsMixin:        # für Generic Views/ ViewSets: ?fields=id,name bzw. ?exclude=description kürzt den Serializer UND die SQL-Abfrage
+    prefetch_fields = {}        # Serializer-Feld -> prefetch_related Lookup (nur wenn das Feld ausgegeben wird)
+    annotate_fields = {}        # Serializer-Feld -> Annotation, z.B. {'market_count': Count('markets')}
+
+    def sparse_fields(self):    # (fields, exclude) aus dem Query-String, nur für lesende Requests
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        fields = request.query_params.get('fields')
+        exclude = request.query_params.get('exclude')
+        return (fields.split(',') if fields else None), (exclude.split(',') if exclude else None)
+
+    def get_serializer(self, *args, **kwargs):
+        fields, exclude = self.sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if exclude is not None:
+            kwargs.setdefault('exclude', exclude)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, exclude = self.sparse_fields()
+        serializer = self.get_serializer_class()(fields=fields, exclude=exclude, context=self.get_serializer_context())
+        readable = {name: field for name, field in serializer.fields.items() if not field.write_only}   # auch ohne ?fields= (z.B. MarketSerializer ohne ?expand=sellers)
+        queryset = queryset.annotate(**{name: value for name, value in self.annotate_fields.items() if name in readable})
+        queryset = queryset.prefetch_related(*[lookup for name, lookup in self.prefetch_fields.items() if name in readable])
+        if fields is None and exclude is None:      # alle Spalten
+            return queryset
+
+        columns = {queryset.model._meta.pk.name}    # die pk wird immer gebraucht (z.B. für 'url')
+        for field in readable.values():
+            try:
+                model_field = queryset.model._meta.get_field(field.source)
+            except FieldDoesNotExist:   # z.B. SerializerMethodField oder annotierte Felder
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+        return queryset.only(*columns)      # nur die benötigten Spalten laden (z.B. ohne die TextFields "description")
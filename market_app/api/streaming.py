@@ -0,0 +1,71 @@
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+
+from .renderers import FastJSONRenderer
+
+
+EXPORT_CHUNK_SIZE = 2000    # so viele Objekte werden pro Datenbank-Abfrage geholt und auf einmal serialisiert
+
+
+def iter_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):    # holt das queryset stückweise (iterator) statt komplett in den Speicher!
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):    # prefetch_related wird mit chunk_size pro Stück ausgeführt
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_rows(queryset, serializer_class, context=None, chunk_size=EXPORT_CHUNK_SIZE, **kwargs):    # liefert jede Zeile einzeln als JSON (bytes), kwargs z.B. fields/exclude für den Serializer
+    renderer = FastJSONRenderer()
+    for chunk in iter_chunks(queryset, chunk_size):
+        for row in serializer_class(chunk, many=True, context=context, **kwargs).data:
+            yield renderer.render(row)
+
+
+class CountedRows:      # zählt die gestreamten Zeilen, am Ende (auch bei Abbruch durch den Client) wird jeder callback(count) aufgerufen
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+        self.callbacks = []     # z.B. CostThrottleMixin: die Kosten eines Exports stehen erst nach dem Streamen fest
+
+    def __iter__(self):
+        try:
+            for row in self.rows:
+                self.count += 1
+                yield row
+        finally:
+            for callback in self.callbacks:
+                callback(self.count)
+
+
+def iter_json_array(rows):      # baut aus den einzelnen Zeilen ein JSON-Array: [row,row,...]
+    yield b'['
+    for index, row in enumerate(rows):
+        yield row if index == 0 else b',' + row
+    yield b']'
+
+
+def iter_ndjson(rows):          # NDJSON: eine Zeile pro Objekt (ohne umschließendes Array)
+    for row in rows:
+        yield row + b'\n'
+
+
+def streaming_json_response(rows, output='json'):
+    if output == 'ndjson':
+        return StreamingHttpResponse(iter_ndjson(rows), content_type='application/x-ndjson')
+    return StreamingHttpResponse(iter_json_array(rows), content_type='application/json')
+
+
+class ExportMixin:      # für ViewSets: fügt die Route <prefix>/export/ hinzu, die ALLE Objekte gestreamt ausliefert (ohne Pagination)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):      # ?output=ndjson für eine Zeile pro Objekt, sonst ein JSON-Array
+        queryset = self.filter_queryset(self.get_queryset())
+        fields, exclude = self.sparse_fields() if hasattr(self, 'sparse_fields') else (None, None)    # dieselben Felder wie das (per SparseFieldsMixin gekürzte) queryset
+        rows = CountedRows(iter_rows(queryset, self.get_serializer_class(), self.get_serializer_context(), EXPORT_CHUNK_SIZE, fields=fields, exclude=exclude))
+        response = streaming_json_response(rows, request.query_params.get('output', 'json'))
+        response.streamed_rows = rows
+        return response
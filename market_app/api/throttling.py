@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+# Drosselung nach "Kosten" statt nach Anzahl der Requests: eine Liste mit 500 Zeilen kostet 500, ein Detail-Request 1,
+# ein Export (/export/) so viele wie gestreamte Zeilen (wird nach dem Streamen nachberechnet).
+# Das Limit gilt pro Client (User bzw. IP) und Scope (throttle_scope der View) und Zeitfenster, z.B. 'products': '30000/min'
+# in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']. Die Zähler liegen in einer eigenen kleinen SQLite-Datei (settings.API_THROTTLE_DATABASE),
+# die alle Worker-Prozesse gemeinsam nutzen. Jede Buchung ist EIN UPSERT und damit atomar (incr() des File- bzw. Database-Cache
+# ist get + set: gleichzeitige Requests würden sich gegenseitig Buchungen überschreiben). Die Haupt-Datenbank wird dafür nicht gesperrt.
+
+
+class CounterStore:     # ein Zähler pro Client und Scope (key), gilt nur für das Zeitfenster "period"
+
+    def __init__(self):
+        self.local = threading.local()      # sqlite3-Verbindungen dürfen nicht zwischen Threads geteilt werden
+
+    def connection(self):
+        path = settings.API_THROTTLE_DATABASE
+        if getattr(self.local, 'path', None) != path:
+            connection = sqlite3.connect(path, timeout=20, isolation_level=None)    # Autocommit: jede Anweisung ist eine eigene Transaktion
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, period INTEGER NOT NULL, cost INTEGER NOT NULL)')
+            self.local.connection, self.local.path = connection, path
+        return self.local.connection
+
+    def get(self, key, period):
+        row = self.connection().execute('SELECT cost FROM counters WHERE key = ? AND period = ?', (key, period)).fetchone()
+        return row[0] if row else 0
+
+    def add(self, key, period, cost):       # ein neues Zeitfenster beginnt wieder bei 0 (späte Buchungen für ein altes Zeitfenster zählen nicht mehr)
+        self.connection().execute(
+            'INSERT INTO counters (key, period, cost) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'cost = CASE WHEN period = excluded.period THEN cost + excluded.cost WHEN period < excluded.period THEN excluded.cost ELSE cost END, '
+            'period = MAX(period, excluded.period)',
+            (key, period, cost),
+        )
+
+    def clear(self):
+        self.connection().execute('DELETE FROM counters')
+
+
+store = CounterStore()
+
+
+def response_cost(response):        # Anzahl der ausgelieferten Zeilen (mindestens 1, z.B. für 304 Not Modified)
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return max(len(data['results']), 1)
+    if isinstance(data, list):
+        return max(len(data), 1)
+    return 1
+
+
+class CostRateThrottle(SimpleRateThrottle):
+    scope_attr = 'throttle_scope'
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):     # die Rate hängt von der View ab und wird erst in allow_request() bestimmt (wie bei ScopedRateThrottle)
+        pass
+
+    @property
+    def THROTTLE_RATES(self):       # bei jedem Request aus den Settings (damit override_settings/ Änderungen wirken)
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope or self.scope not in self.THROTTLE_RATES:    # Views ohne Scope/ Rate werden nicht gedrosselt
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.get_rate())
+        self.now = self.timer()
+        self.key, self.period = self.get_cache_key(request, view), int(self.now // self.duration)
+        if store.get(self.key, self.period) >= self.num_requests:
+            return False        # abgelehnte Requests (429) kosten nichts, sonst würde ein Client mit jedem Versuch nach Retry-After weiter gesperrt
+        request._cost_throttles = [*getattr(request, '_cost_throttles', []), self]
+        return True
+
+    def wait(self):     # Sekunden bis zum nächsten Zeitfenster (wird von DRF als Retry-After Header gesendet)
+        return (self.period + 1) * self.duration - self.now
+
+    def charge(self, cost):     # nach dem Request: die Kosten zum Zähler addieren
+        store.add(self.key, self.period, cost)
+
+
+class CostThrottleMixin:        # für Views mit throttle_scope: berechnet die Kosten erst, wenn die Antwort feststeht
+
+    throttle_classes = [CostRateThrottle]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        throttles = getattr(request, '_cost_throttles', [])
+        if throttles:
+            cost = response_cost(response)
+            for throttle in throttles:
+                throttle.charge(cost)
+            rows = getattr(response, 'streamed_rows', None)     # Export (StreamingHttpResponse ohne .data): die übrigen Zeilen nach dem Streamen
+            if rows is not None:
+                rows.callbacks.append(lambda count: [throttle.charge(count - cost) for throttle in throttles if count > cost])
+        return response
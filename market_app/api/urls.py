@@ -1,7 +1,9 @@
 from django.urls import path, include
 from .views import markets_view, market_single_view, sellers_view, products_view, seller_single_view, product_single_view, \
-    MarketsView, SellersView, MarketDetailView, MarketSingleView, SellerOfMarketList, ProductViewSet, SellerSingleView, SellerViewSet
+    MarketsView, SellersView, MarketDetailView, MarketSingleView, SellerOfMarketList, ProductViewSet, SellerSingleView, SellerViewSet, SearchView, \
+    MarketStatsList, MarketStatsDetail, ChangeFeedView
 from rest_framework import routers
+from . import async_views, events
 
 # Bei zu vielen Routes sollte man es in eine extra Datei verschieben!
 router = routers.SimpleRouter()
@@ -13,7 +15,18 @@ urlpatterns = [
     path('', include(router.urls)),
     path('market/', MarketsView.as_view()),
     path('market/<int:pk>/', MarketSingleView.as_view(), name='market-detail'),      # pk (primary key = id aus Datenbank) wird übergeben! name verweist auf den HyperlinkedModelSerializer in der serializers.py
-    path('market/<int:pk>/sellers/', SellerOfMarketList.as_view()),
+    path('market/<int:pk>/sellers/', SellerOfMarketList.as_view(), name='market-sellers'),
+    path('market/stats/', MarketStatsList.as_view()),
+    path('market/<int:pk>/stats/', MarketStatsDetail.as_view()),
+    path('search/', SearchView.as_view()),
+    path('changes/', ChangeFeedView.as_view(), name='changes'),
+    path('async/market/', async_views.markets_view),      # async Varianten (für den Betrieb unter ASGI, siehe supermarket/asgi.py)
+    path('async/market/<int:pk>/', async_views.market_single_view),
+    path('async/sellers/', async_views.sellers_view),
+    path('async/sellers/<int:pk>/', async_views.seller_single_view),
+    path('async/products/', async_views.products_view),
+    path('async/products/<int:pk>/', async_views.product_single_view),
+    path('events/', events.events_view),     # Server-Sent Events (nur unter ASGI)
     # path('seller/', SellersView.as_view()),
     # path('seller/<int:pk>/', SellerSingleView.as_view(), name='seller-detail'),     # name verweist auf den view_name des HyperlinkedRelatedField in der serializers.py
     # path('product/', products_view),
@@ -2,33 +2,102 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-
-from .serializers import MarketSerializer, SellerSerializer, MarketHyperlinkedSerializer, ProductSerializer, ProductHyperlinkedSerializer, ProductCreateSerializer, SellerListSerializer
-from market_app.models import Market, Seller, Product
+from django.db import transaction
+from django.db.models import Count, Prefetch
+
+from .cache import CachedRetrieveMixin
+from .fast import FastListMixin
+from .filters import OrderingFilter, ProductFilter
+from .conditional import ConditionalListMixin, ConditionalRetrieveMixin
+from .sparse import SparseFieldsMixin
+from .renderers import FastJSONRenderer
+from .streaming import ExportMixin, streaming_json_response
+from .throttling import CostThrottleMixin
+from .serializers import SELLER_PREVIEW_SIZE, MarketStatsSerializer, SellerMembershipSerializer, SearchQuerySerializer, ChangeQuerySerializer, BULK_MAX_ROWS, ProductBulkSerializer, ProductBulkDeleteSerializer, MarketSerializer, SellerSerializer, MarketHyperlinkedSerializer, ProductSerializer, ProductHyperlinkedSerializer, ProductCreateSerializer, SellerListSerializer
+from market_app.models import Market, MarketStats, Seller, Product
+from market_app import changes, search, stats
 
 from rest_framework.views import APIView
 from rest_framework import mixins
 from rest_framework import generics
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
+
+
+SELLER_ANNOTATIONS = {'market_count': Count('markets', distinct=True)}     # Anzahl der Markets direkt in der Abfrage (statt einer Abfrage pro Seller)
+
+
+def seller_queryset():      # Seller inkl. Anzahl der Markets (annotate) und den Markets selbst (prefetch) -> feste Anzahl an Abfragen statt 2 pro Seller!
+    return Seller.objects.annotate(**SELLER_ANNOTATIONS).prefetch_related('markets')
+
+
+MARKET_ANNOTATIONS = {'seller_count': Count('sellers', distinct=True)}
+
+
+def seller_preview_prefetch():      # nur die ersten Seller pro Market (Slice im Prefetch -> eine Abfrage mit Window-Funktion für alle Markets)
+    return Prefetch('sellers', queryset=Seller.objects.only('id').order_by('id')[:SELLER_PREVIEW_SIZE], to_attr='preview_sellers')
+
+
+def market_queryset(expand=()):     # für die async Views (gleiche Abfragen wie MarketFieldsMixin)
+    queryset = Market.objects.annotate(**MARKET_ANNOTATIONS).prefetch_related(seller_preview_prefetch())
+    return queryset.prefetch_related('sellers') if 'sellers' in expand else queryset
+
+
+class MarketFieldsMixin(SparseFieldsMixin):     # die Links zu den Sellern werden nur geladen, wenn sie auch ausgegeben werden
+    annotate_fields = MARKET_ANNOTATIONS
+
+    @property
+    def prefetch_fields(self):      # "sellers" ist nur mit ?expand=sellers im Serializer enthalten
+        return {'sellers': 'sellers', 'sellers_preview': seller_preview_prefetch()}
 
 
-class MarketsView(generics.ListAPIView):  # beinhaltet nur die GET-Methode!
+class SellerFieldsMixin(SparseFieldsMixin):     # wie seller_queryset(), aber nur für die angefragten Felder (?fields=)
+    annotate_fields = SELLER_ANNOTATIONS
+    prefetch_fields = {'markets': 'markets'}
+
+
+class BatchedDestroyMixin:      # für Markets/ Seller: das Löschen entfernt auch alle ihre Products (ein UPDATE der Statistik und ein INSERT ins Änderungsprotokoll statt je einem pro Product)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(), stats.batched(), changes.batched():
+            super().perform_destroy(instance)
+
+
+class MarketsView(CostThrottleMixin, ConditionalListMixin, MarketFieldsMixin, generics.ListAPIView):  # beinhaltet nur die GET-Methode!
     queryset = Market.objects.all()     # Abfrage-Grundlage (angezeigte Daten)
     serializer_class = MarketSerializer     # verbundene Serializer (von serializers.py)
+    throttle_scope = 'markets'      # Limit siehe REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
 
 
-class MarketSingleView(generics.RetrieveUpdateDestroyAPIView):       # beinhaltet die GET-, PUT-, PATCH- und DELETE-Methode!
+class MarketSingleView(ConditionalRetrieveMixin, CachedRetrieveMixin, BatchedDestroyMixin, MarketFieldsMixin, generics.RetrieveUpdateDestroyAPIView):       # beinhaltet die GET-, PUT-, PATCH- und DELETE-Methode! (GET wird pro Objekt gecacht)
     queryset = Market.objects.all()
     serializer_class = MarketSerializer
 
 
-class SellerOfMarketList(generics.ListCreateAPIView):     # zeigt alle Seller eines Market-Objektes in einer Liste an!
+class MarketStatsList(generics.ListAPIView):     # Statistik aller Markets (vorberechnet -> eine Abfrage pro Seite)
+    queryset = MarketStats.objects.all()
+    serializer_class = MarketStatsSerializer
+
+
+class MarketStatsDetail(generics.RetrieveAPIView):     # Statistik eines Markets: /api/market/<pk>/stats/
+    queryset = MarketStats.objects.all()
+    serializer_class = MarketStatsSerializer
+    lookup_field = 'market_id'      # die pk in der URL ist die des Markets
+    lookup_url_kwarg = 'pk'
+
+
+class SellerOfMarketList(CostThrottleMixin, ConditionalListMixin, SellerFieldsMixin, generics.ListCreateAPIView):     # zeigt alle Seller eines Market-Objektes in einer Liste an!
+    queryset = Seller.objects.all()
     serializer_class = SellerListSerializer
+    throttle_scope = 'market_sellers'
 
     def get_queryset(self):       # Funktion zum Anpassen des "queryset"
-        pk = self.kwargs.get('pk')  # holt sich die pk aus der URL
-        market = Market.objects.get(pk=pk)  # holt sich das entsprechende Market-Objekt mit der pk
-        return market.sellers.all() # gibt alle Seller des Market-Objektes zurück
+        if not hasattr(self, 'market'):     # get_queryset() wird pro Request zweimal aufgerufen (ETag und Liste), der Market wird nur einmal geladen
+            pk = self.kwargs.get('pk')  # holt sich die pk aus der URL
+            self.market = get_object_or_404(Market, pk=pk)  # holt sich das entsprechende Market-Objekt mit der pk
+        return super().get_queryset().filter(markets=self.market)     # gibt alle Seller des Market-Objektes zurück (filter erst NACH annotate, sonst würde nur dieser eine Market gezählt!)
     
     def perform_create(self, serializer):   # Funktion zum Erstellen eines Sellers, der mit dem referenzierten Market-Objekt verbunden ist! 
         pk = self.kwargs.get('pk')
@@ -70,7 +139,7 @@ def markets_view(request):
         #     return Response({'message': 'error'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class MarketDetailView(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, generics.GenericAPIView):
+class MarketDetailView(BatchedDestroyMixin, MarketFieldsMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, generics.GenericAPIView):
     queryset = Market.objects.all()
     serializer_class = MarketSerializer
 
@@ -109,22 +178,29 @@ def market_single_view(request, pk):                # single view (Anzeige eines
 
 
 # für sellers:
-class SellerViewSet(viewsets.ModelViewSet):
-    queryset = Seller.objects.all()
+class SellerViewSet(CostThrottleMixin, ConditionalListMixin, ConditionalRetrieveMixin, CachedRetrieveMixin, ExportMixin, BatchedDestroyMixin, SellerFieldsMixin, viewsets.ModelViewSet):   # ExportMixin: /api/sellers/export/
+    queryset = Seller.objects.all()     # inkl. market_count und markets (siehe SellerFieldsMixin)
     serializer_class = SellerSerializer
+    throttle_scope = 'sellers'
+
+    @action(detail=False, methods=['put'])
+    def markets(self, request):     # /api/sellers/markets/: ersetzt die Markets vieler Seller in einer Transaktion
+        serializer = SellerMembershipSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
 
 
-class SellersView(generics.ListCreateAPIView):
+class SellersView(SellerFieldsMixin, generics.ListCreateAPIView):
     queryset = Seller.objects.all()
     serializer_class = SellerSerializer
 
 
-class SellerSingleView(generics.RetrieveUpdateDestroyAPIView):
+class SellerSingleView(BatchedDestroyMixin, SellerFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Seller.objects.all()
     serializer_class = SellerSerializer
 
 
-class SellersViewOld(mixins.ListModelMixin, mixins.CreateModelMixin, generics.GenericAPIView):     # ersetzt komplett die Function-based View "sellers_view"
+class SellersViewOld(SellerFieldsMixin, mixins.ListModelMixin, mixins.CreateModelMixin, generics.GenericAPIView):     # ersetzt komplett die Function-based View "sellers_view"
     queryset = Seller.objects.all()
     serializer_class = SellerSerializer
 
@@ -179,9 +255,89 @@ def seller_single_view(request, pk):
 
 
 # für products:
-class ProductViewSet(viewsets.ModelViewSet):    # ersetzt komplett das einfache ViewSet (inkl. PUT/PATCH)
+class ProductViewSet(CostThrottleMixin, ConditionalListMixin, ConditionalRetrieveMixin, CachedRetrieveMixin, ExportMixin, FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):    # ersetzt komplett das einfache ViewSet (inkl. PUT/PATCH), ExportMixin: /api/products/export/
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    throttle_scope = 'products'
+    filter_backends = [ProductFilter, OrderingFilter]
+    ordering = ['id']       # Standard-Sortierung (wenn kein ?ordering= übergeben wird)
+    write_actions = {'create', 'update', 'partial_update'}
+
+    def get_serializer_class(self):     # Schreiben über ProductCreateSerializer (eine Abfrage für market/ seller, UPDATE nur der geänderten Spalten)
+        if self.action in self.write_actions:
+            return ProductCreateSerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=['post', 'put', 'patch', 'delete'])
+    def bulk(self, request):        # /api/products/bulk/: viele Products auf einmal erstellen (POST), ändern (PUT/PATCH) oder löschen (DELETE)
+        if request.method == 'DELETE':
+            serializer = ProductBulkDeleteSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic(), stats.batched(), changes.batched():     # ein UPDATE der Statistik und ein INSERT ins Änderungsprotokoll statt je einem pro gelöschtem Product
+                deleted, _ = Product.objects.filter(id__in=serializer.validated_data['ids']).delete()
+            return Response({'deleted': deleted})
+
+        if request.method == 'POST':
+            serializer = ProductBulkSerializer(data=request.data, many=True, max_length=BULK_MAX_ROWS)
+        else:
+            serializer = ProductBulkSerializer(Product.objects.all(), data=request.data, many=True, max_length=BULK_MAX_ROWS, partial=request.method == 'PATCH')
+        serializer.is_valid(raise_exception=True)   # bei Fehlern: 400 mit einer Liste von Fehlern pro Zeile
+        products = serializer.save()
+        response_status = status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK
+        return Response(ProductSerializer(products, many=True).data, status=response_status)
+
+
+class SearchView(APIView):      # Volltextsuche über Products und Markets: /api/search/?q=apfel (optional &type=product), sortiert nach Relevanz
+    models = {'product': Product, 'market': Market}
+
+    def get(self, request):
+        if not search.is_available():
+            return Response({'detail': 'Die Suche ist nur mit SQLite verfügbar.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        query = SearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        types = [params['type']] if 'type' in params else list(search.SEARCH_TABLES)
+        hits = search.search(params['q'], types, params['page_size'] + 1, params['offset'])   # ein Treffer mehr, um zu wissen ob es eine nächste Seite gibt
+
+        objects = {kind: self.models[kind].objects.only('id', 'name').in_bulk([pk for hit_kind, pk, rank in hits if hit_kind == kind]) for kind in types}
+        results = [
+            {
+                'type': kind,
+                'id': pk,
+                'url': reverse(f'{kind}-detail', kwargs={'pk': pk}, request=request),
+                'name': objects[kind][pk].name,
+                'rank': rank,
+            }
+            for kind, pk, rank in hits[:params['page_size']]
+            if pk in objects[kind]
+        ]
+
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(url, 'offset', params['offset'] + params['page_size']) if len(hits) > params['page_size'] else None
+        previous_url = replace_query_param(url, 'offset', max(params['offset'] - params['page_size'], 0)) if params['offset'] else None
+        return Response({'next': next_url, 'previous': previous_url, 'results': results})
+
+
+class ChangeFeedView(APIView):      # /api/changes/?since=<seq>: alle Änderungen nach seq (gestreamt, ?output=ndjson für eine Zeile pro Änderung)
+
+    def get(self, request):
+        query = ChangeQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data['since']
+        last_seq = changes.last_seq()       # bis hierhin wird ausgeliefert (spätere Änderungen holt der Client mit ?since=<X-Last-Seq>)
+        if since < changes.floor():         # dazwischen wurden Einträge gelöscht (compact_changes --max-age)
+            return Response(
+                {'detail': 'Die Änderungen seit dieser seq sind nicht mehr vorhanden, bitte komplett neu laden.', 'last_seq': last_seq},
+                status=status.HTTP_410_GONE, headers={'X-Last-Seq': last_seq},
+            )
+        renderer = FastJSONRenderer()
+        rows = (
+            renderer.render({'seq': row['seq'], 'op': row['op'], 'model': row['model'], 'id': row['object_id']})
+            for row in changes.iter_changes(since, last_seq)
+        )
+        response = streaming_json_response(rows, query.validated_data['output'])
+        response['X-Last-Seq'] = last_seq
+        return response
 
 
 class ProductViewSetOld(viewsets.ViewSet):     # ersetzt die Function-based products_view und product_single_view (außer PUT/PATCH)
@@ -0,0 +1,54 @@
+import random
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from market_app import search, stats
+from market_app.models import Market, Seller, Product
+
+
+# Erzeugt einen künstlichen Katalog (gleicher seed = gleiche Daten) direkt per executemany (ohne Models/ Signals).
+# Danach werden die Statistik (MarketStats) und der Suchindex neu aufgebaut.
+
+BATCH_SIZE = 10000
+WORDS = ['Apfel', 'Birne', 'Brot', 'Käse', 'Milch', 'Kaffee', 'Tee', 'Reis', 'Nudeln', 'Honig', 'Saft', 'Butter', 'Salz', 'Zucker', 'Mehl', 'Öl']
+CITIES = ['Berlin', 'Hamburg', 'München', 'Köln', 'Wien', 'Zürich', 'Leipzig', 'Bremen']
+
+
+def generate(seed=1, markets=10000, sellers=100000, products=1000000, markets_per_seller=3):
+    rng = random.Random(seed)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    insert(Market, ['name', 'location', 'description', 'net_worth', 'updated_at'], (
+        (f'Markt {i}', rng.choice(CITIES), f'{rng.choice(WORDS)}markt Nummer {i}', f'{rng.randint(1000, 10000000)}.00', now)
+        for i in range(1, markets + 1)
+    ))
+    insert(Seller, ['name', 'contact_info', 'updated_at'], (
+        (f'Seller {i}', f'seller{i}@example.com', now) for i in range(1, sellers + 1)
+    ))
+    insert(Seller.markets.through, ['seller_id', 'market_id'], (
+        (seller_id, market_id)
+        for seller_id in range(1, sellers + 1)
+        for market_id in sorted(set(rng.randint(1, markets) for _ in range(rng.randint(1, markets_per_seller))))
+    ))
+    insert(Product, ['name', 'description', 'price', 'market_id', 'seller_id', 'updated_at'], (
+        (f'{rng.choice(WORDS)} {i}', f'{rng.choice(WORDS)} aus {rng.choice(CITIES)}', f'{rng.randint(10, 100000) / 100:.2f}',
+         rng.randint(1, markets), rng.randint(1, sellers), now)
+        for i in range(1, products + 1)
+    ))
+    stats.rebuild()
+    if search.is_available():
+        search.rebuild()
+
+
+def insert(model, columns, rows):       # die ids werden von 1 an vergeben (die Tabellen müssen leer sein)
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})'
+    batch = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
@@ -0,0 +1,132 @@
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import override_settings
+
+from market_app import changes, stats
+from market_app.middleware import QueryCounter
+from market_app.models import Change, Product
+
+
+# Feste Szenarien: jedes liefert pro Aufruf (Methode, Pfad, Daten) mit Zufallswerten aus einem eigenen seed.
+# sizes: Anzahl der erzeugten Markets/Sellers/Products (die ids gehen von 1 bis zur Anzahl, siehe generator.py)
+
+def product_list(rng, sizes):
+    return 'get', '/api/products/', None
+
+
+def product_detail(rng, sizes):
+    return 'get', f'/api/products/{rng.randint(1, sizes["products"])}/', None
+
+
+def product_create(rng, sizes):
+    return 'post', '/api/products/', {
+        'name': 'Benchmark', 'description': 'Beschreibung', 'price': f'{rng.randint(10, 10000) / 100:.2f}',
+        'market': rng.randint(1, sizes['markets']), 'seller': rng.randint(1, sizes['sellers']),
+    }
+
+
+def product_filtered_list(rng, sizes):
+    return 'get', f'/api/products/?market={rng.randint(1, sizes["markets"])}&min_price=10&ordering=price', None
+
+
+def market_sellers(rng, sizes):
+    return 'get', f'/api/market/{rng.randint(1, sizes["markets"])}/sellers/', None
+
+
+SCENARIOS = {
+    'list': product_list,
+    'detail': product_detail,
+    'create': product_create,
+    'filtered_list': product_filtered_list,
+    'market_sellers': market_sellers,
+}
+WRITING = {'create'}        # legen Products an, die nach dem Szenario wieder gelöscht werden (sonst wächst eine wiederverwendete --database mit jedem Lauf)
+MEMORY_REQUESTS = 20        # die Speichermessung (tracemalloc) bremst stark, daher nur für wenige zusätzliche Requests
+
+
+def run(name, sizes, requests=200, warmup=10, seed=1, memory_requests=MEMORY_REQUESTS):
+    # ohne Drosselung: sonst misst man die Zähler (bzw. 429-Antworten wegen der Zähler früherer Läufe) statt der Endpunkte
+    with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}):
+        last_product = Product.objects.aggregate(last=Max('id'))['last'] or 0
+        last_change = changes.last_seq()
+        try:
+            return measure(SCENARIOS[name], sizes, requests, warmup, seed, memory_requests)
+        finally:
+            if name in WRITING:
+                remove_created(last_product, last_change)
+
+
+def remove_created(last_product, last_change):      # Products, Statistik, Suchindex (Trigger) und Änderungsprotokoll wieder auf den Stand vor dem Szenario
+    with transaction.atomic(), stats.batched(), changes.batched():
+        Product.objects.filter(id__gt=last_product).delete()
+    Change.objects.filter(seq__gt=last_change).delete()
+
+
+def measure(scenario, sizes, requests, warmup, seed, memory_requests):
+    rng, client = random.Random(seed), Client()
+
+    def call():
+        method, path, data = scenario(rng, sizes)
+        return getattr(client, method)(path, data, content_type='application/json') if data else getattr(client, method)(path)
+
+    for _ in range(warmup):
+        call()
+    latencies, queries, errors = [], [], 0
+    for _ in range(requests):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:       # "default" und "read"
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            start = time.perf_counter()
+            response = call()
+            latencies.append(time.perf_counter() - start)
+        queries.append(counter.count)
+        errors += response.status_code >= 400
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(memory_requests):
+        tracemalloc.reset_peak()
+        call()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        **{f'p{p}_ms': percentile(latencies, p) * 1000 for p in (50, 90, 95, 99)},
+        'queries_mean': statistics.fmean(queries),
+        'queries_max': max(queries),
+        'peak_memory_kb': peak // 1024,
+    }
+
+
+def percentile(values, p):      # values muss sortiert sein (nächstgelegener Rang)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+COMPARED = ['p50_ms', 'p95_ms', 'queries_mean', 'peak_memory_kb']
+
+
+def compare(baseline, current, threshold=0.25):     # gibt die Verschlechterungen um mehr als threshold (0.25 = 25 %) zurück
+    regressions = []
+    for name, result in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        for metric in COMPARED:
+            if before[metric] and result[metric] > before[metric] * (1 + threshold):
+                regressions.append(f'{name}.{metric}: {before[metric]:.2f} -> {result[metric]:.2f} (+{(result[metric] / before[metric] - 1) * 100:.0f}%)')
+            elif not before[metric] and result[metric] > 0 and metric == 'queries_mean':
+                regressions.append(f'{name}.{metric}: 0 -> {result[metric]:.2f}')
+    return regressions
@@ -0,0 +1,89 @@
+import csv
+import gzip
+import itertools
+import json
+import os
+from collections import defaultdict
+
+from market_app.models import Market, Seller, Product
+
+
+# Dateiformate für den Import/Export des Katalogs (manage.py import_catalogue/ export_catalogue):
+# CSV mit Kopfzeile oder NDJSON (ein JSON-Objekt pro Zeile), jeweils optional mit gzip komprimiert (*.gz)
+
+MODELS = {'market': Market, 'seller': Seller, 'product': Product}
+FIELDS = {      # Spalten pro Model (zusätzlich optional "id"), "market"/"seller" sind Referenzen, "markets" eine Liste von Referenzen
+    'market': ['name', 'location', 'description', 'net_worth'],
+    'seller': ['name', 'contact_info', 'markets'],
+    'product': ['name', 'description', 'price', 'market', 'seller'],
+}
+FORMATS = ['csv', 'ndjson']
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+LIST_SEPARATOR = ';'    # in CSV-Dateien werden Listen (z.B. markets) als "1;2;3" geschrieben
+
+
+def detect_format(path):        # z.B. products.ndjson.gz -> 'ndjson' (None, wenn die Endung unbekannt ist)
+    name = path[:-3] if path.endswith('.gz') else path
+    return EXTENSIONS.get(os.path.splitext(name)[1].lower())
+
+
+def open_text(path, mode='rt'):     # öffnet die Datei als Text (bei *.gz wird beim Lesen/ Schreiben ent-/ komprimiert)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def read_rows(file, fmt):       # liest Zeile für Zeile (Generator -> der Speicherverbrauch hängt nicht von der Dateigröße ab)
+    if fmt == 'csv':
+        for row in csv.DictReader(file):
+            if 'markets' in row:
+                row['markets'] = [value for value in (row['markets'] or '').split(LIST_SEPARATOR) if value]
+            yield row
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_rows(name, start, end, chunk_size=2000):      # alle Objekte mit start <= id < end im Import-Format (mit id), sortiert nach id
+    model = MODELS[name]
+    keys = ['id'] + [field for field in FIELDS[name] if field != 'markets']
+    columns = [f'{key}_id' if key in ('market', 'seller') else key for key in keys]
+    rows = model.objects.filter(id__gte=start, id__lt=end).order_by('id').values_list(*columns).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))    # nie mehr als chunk_size Zeilen im Speicher
+        if not chunk:
+            return
+        markets = defaultdict(list)
+        if 'markets' in FIELDS[name]:       # die Markets der Seller mit einer Abfrage pro chunk
+            memberships = Seller.markets.through.objects.filter(seller_id__in=[values[0] for values in chunk]).order_by('market_id')
+            for seller_id, market_id in memberships.values_list('seller_id', 'market_id'):
+                markets[seller_id].append(market_id)
+        for values in chunk:
+            row = dict(zip(keys, values))
+            if 'markets' in FIELDS[name]:
+                row['markets'] = markets[row['id']]
+            yield row
+
+
+def write_rows(file, fmt, name, rows):      # Gegenstück zu read_rows(), gibt die Anzahl der geschriebenen Zeilen zurück
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, fieldnames=['id'] + FIELDS[name])
+        writer.writeheader()
+        for row in rows:
+            if 'markets' in row:
+                row['markets'] = LIST_SEPARATOR.join(map(str, row['markets']))
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            file.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')     # default=str: Decimal -> "1.50"
+            count += 1
+    return count
+
+
+def export_shard(name, start, end, path, fmt):      # wird in den Worker-Prozessen von export_catalogue ausgeführt (muss daher auf Modulebene stehen)
+    with open_text(path, 'wt') as file:
+        rows = write_rows(file, fmt, name, export_rows(name, start, end))
+    return {'file': os.path.basename(path), 'rows': rows, 'min_id': start, 'max_id': end - 1, 'bytes': os.path.getsize(path)}
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from threading import local
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from market_app.models import Change
+
+
+# Änderungsprotokoll für den inkrementellen Abgleich (/api/changes/?since=<seq>): pro geändertem Objekt eine Zeile (op, model, pk).
+# Die Zeilen werden direkt in den Signal-Handlern geschrieben (market_app/signals.py, nicht per on_commit): innerhalb von
+# transaction.atomic() (z.B. Bulk-Löschen, Katalog-Import, verschachtelte Serializer) also in derselben Transaktion wie die Änderung.
+# Im Autocommit-Modus ist die Änderung beim post_save/post_delete bereits committet, die Zeile folgt als eigener INSERT
+# (stürzt der Prozess genau dazwischen ab, fehlt die Zeile). SQLite schreibt immer nur eine Transaktion gleichzeitig,
+# daher ist die Reihenfolge der seq auch die Reihenfolge der Commits (ein Client verpasst mit ?since= keine Änderung).
+
+BATCH_SIZE = 1000       # so viele Zeilen pro INSERT bzw. pro Abfrage beim Ausliefern
+
+_batch = local()
+
+
+@contextmanager
+def batched():      # sammelt alle Einträge (z.B. die post_delete Signals von queryset.delete()) und schreibt sie am Ende mit bulk_create
+    if getattr(_batch, 'rows', None) is not None:
+        yield
+        return
+    _batch.rows = []
+    try:
+        yield
+        rows = _batch.rows
+    finally:
+        _batch.rows = None
+    unique = {(row.op, row.model, row.object_id): row for row in rows}     # z.B. derselbe Seller aus mehreren Signals nur einmal
+    Change.objects.bulk_create(unique.values(), batch_size=BATCH_SIZE)
+
+
+def record(op, model, pks):     # z.B. record('update', Seller, [1, 2, 3])
+    rows = [Change(op=op, model=model._meta.model_name, object_id=pk) for pk in pks]
+    if getattr(_batch, 'rows', None) is not None:
+        _batch.rows.extend(rows)
+    elif rows:
+        Change.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def last_seq():
+    return Change.objects.aggregate(last=Max('seq'))['last'] or 0
+
+
+def floor():        # Clients mit einem kleineren ?since= haben gelöschte Einträge verpasst und müssen komplett neu laden
+    return Change.objects.filter(op='compact').order_by('-seq').values_list('object_id', flat=True).first() or 0
+
+
+async def alast_seq():        # für die async Views (market_app/api/events.py)
+    return (await Change.objects.aaggregate(last=Max('seq')))['last'] or 0
+
+
+async def afloor():
+    return await Change.objects.filter(op='compact').order_by('-seq').values_list('object_id', flat=True).afirst() or 0
+
+
+async def afetch(since, until=None):     # die nächsten (höchstens BATCH_SIZE) Einträge nach since
+    queryset = Change.objects.filter(seq__gt=since).exclude(op='compact')
+    if until is not None:
+        queryset = queryset.filter(seq__lte=until)
+    return [row async for row in queryset.order_by('seq').values('seq', 'op', 'model', 'object_id')[:BATCH_SIZE]]
+
+
+def iter_changes(since, until):     # alle Einträge mit since < seq <= until, stückweise nach seq (ohne die compact-Markierungen)
+    while True:
+        batch = list(
+            Change.objects.filter(seq__gt=since, seq__lte=until).exclude(op='compact').order_by('seq')
+            .values('seq', 'op', 'model', 'object_id')[:BATCH_SIZE]
+        )
+        yield from batch
+        if len(batch) < BATCH_SIZE:
+            return
+        since = batch[-1]['seq']
+
+
+def compact(max_age=None):      # gibt (zusammengefasst, abgelaufen) zurück
+    with transaction.atomic():
+        latest = Change.objects.values('model', 'object_id').annotate(last=Max('seq')).values('last')
+        merged, _ = Change.objects.exclude(op='compact').exclude(seq__in=latest).delete()     # pro Objekt reicht die letzte Änderung (create/update = aktuellen Stand holen)
+        expired = 0
+        if max_age is not None:
+            old = Change.objects.exclude(op='compact').filter(created_at__lt=timezone.now() - timedelta(days=max_age))
+            cut = old.aggregate(last=Max('seq'))['last']
+            if cut is not None:
+                expired, _ = old.delete()
+                Change.objects.filter(op='compact').delete()
+                Change.objects.create(op='compact', model='', object_id=cut)
+    return merged, expired
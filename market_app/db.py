@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+WRITE_ALIAS = 'default'
+READ_ALIAS = 'read'
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):     # wird bei jeder neuen Datenbank-Verbindung ausgeführt (PRAGMAs aus settings.SQLITE_PRAGMAS)
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class ReadWriteRouter:      # Lesen über die Verbindung "read" (query_only), Schreiben immer über "default"
+
+    def db_for_read(self, model, **hints):
+        if READ_ALIAS not in settings.DATABASES or connections[WRITE_ALIAS].in_atomic_block:
+            return WRITE_ALIAS      # innerhalb einer Transaktion müssen die eigenen (noch nicht committeten) Änderungen sichtbar sein!
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return WRITE_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True     # beide Aliase zeigen auf dieselbe Datenbank
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == WRITE_ALIAS
@@ -0,0 +1,90 @@
+import json
+import os
+import platform
+import tempfile
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from market_app.api import cache
+from market_app.benchmarks import generator, scenarios
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark der API: erzeugt einen künstlichen Katalog in einer eigenen SQLite-Datenbank, misst feste Szenarien '
+        '(Latenz-Perzentile, SQL-Abfragen, Speicher) und schreibt das Ergebnis als JSON. Mit --compare schlägt der Befehl fehl, '
+        'wenn sich ein Wert gegenüber einem früheren Ergebnis um mehr als --threshold verschlechtert hat.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--markets', type=int, default=10000)
+        parser.add_argument('--sellers', type=int, default=100000)
+        parser.add_argument('--products', type=int, default=1000000)
+        parser.add_argument('--scenarios', nargs='+', choices=list(scenarios.SCENARIOS), default=list(scenarios.SCENARIOS))
+        parser.add_argument('--requests', type=int, default=200, help='gemessene Requests pro Szenario')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--database', help='Datei der Benchmark-Datenbank (wird wiederverwendet, wenn sie existiert), Standard: temporär')
+        parser.add_argument('--output', default='bench_api.json')
+        parser.add_argument('--compare', help='früheres Ergebnis (JSON), mit dem verglichen wird')
+        parser.add_argument('--threshold', type=float, default=0.25, help='erlaubte Verschlechterung (0.25 = 25 %%)')
+
+    def handle(self, *args, **options):
+        sizes = {name: options[name] for name in ('markets', 'sellers', 'products')}
+        with tempfile.TemporaryDirectory() as directory:
+            path = options['database'] or os.path.join(directory, 'bench.sqlite3')
+            reuse = os.path.exists(path)
+            original = self.use_database(path)
+            try:
+                if not reuse:
+                    call_command('migrate', verbosity=0)
+                    self.stdout.write(f'Erzeuge Katalog (seed {options["seed"]}, {sizes}) ...')
+                    generator.generate(options['seed'], **sizes)
+                results = self.run(options, sizes)
+            finally:
+                self.use_database(*original)
+
+        results['meta'].update(seed=options['seed'], sizes=sizes, reused_database=reuse)
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(f'Ergebnis: {options["output"]}')
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            regressions = scenarios.compare(baseline, results, options['threshold'])
+            if regressions:
+                raise CommandError('Verschlechterung gegenüber ' + options['compare'] + ':\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f'Keine Verschlechterung über {options["threshold"]:.0%} gegenüber {options["compare"]}.'))
+
+    def use_database(self, default_name, read_name=None):      # wie der Test-Runner: die Verbindungen auf eine andere Datei umstellen
+        original = []
+        for alias, name in (('default', default_name), ('read', read_name or default_name)):
+            if alias in connections:
+                connection = connections[alias]
+                connection.close()
+                original.append(connection.settings_dict['NAME'])
+                connection.settings_dict['NAME'] = name
+        return original
+
+    def run(self, options, sizes):
+        results = {
+            'meta': {'created_at': timezone.now().isoformat(), 'python': platform.python_version(), 'django': django.get_version()},
+            'scenarios': {},
+        }
+        self.stdout.write(f'{"scenario":<15} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"peak KB":>8} {"errors":>6}')
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name in options['scenarios']:
+                cache.get_cache().clear()
+                result = scenarios.run(name, sizes, options['requests'], options['warmup'], options['seed'])
+                results['scenarios'][name] = result
+                self.stdout.write(
+                    f'{name:<15} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} '
+                    f'{result["queries_mean"]:>8.1f} {result["peak_memory_kb"]:>8} {result["errors"]:>6}'
+                )
+        return results
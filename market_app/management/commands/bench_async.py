@@ -0,0 +1,57 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: sync Views (WSGI-Handler, ein Thread pro Request) gegen async Views (ASGI-Handler, Event-Loop) bei gleicher Parallelität.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Anzahl Requests pro Variante')
+        parser.add_argument('--concurrency', type=int, default=50, help='gleichzeitige Requests')
+        parser.add_argument('--path', default='products/', help='Pfad unter /api/ bzw. /api/async/')
+
+    def handle(self, *args, **options):
+        count, concurrency, path = options['requests'], options['concurrency'], options['path']
+        with override_settings(ALLOWED_HOSTS=['testserver']):      # Host der Test-Clients
+            self.report('wsgi', *self.run_sync(f'/api/{path}', count, concurrency))
+            self.report('asgi', *asyncio.run(self.run_async(f'/api/async/{path}', count, concurrency)))
+
+    def run_sync(self, url, count, concurrency):
+        client = Client()
+
+        def request(_):
+            start = time.perf_counter()
+            client.get(url)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:    # jeder gleichzeitige Request belegt einen Thread
+            latencies = list(pool.map(request, range(count)))
+        return time.perf_counter() - start, latencies
+
+    async def run_async(self, url, count, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                start = time.perf_counter()
+                await client.get(url)
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(request() for _ in range(count)))
+        return time.perf_counter() - start, latencies
+
+    def report(self, name, total, latencies):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f'{name}: {len(latencies) / total:.0f} req/s, p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms'
+        )
@@ -0,0 +1,47 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from market_app.api import renderers
+from market_app.api.fast import FastProductHyperlinkedSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: JSONRenderer von DRF gegen FastJSONRenderer für große /api/products/ und /api/sellers/ Antworten.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Anzahl Objekte pro Antwort')
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson ist nicht installiert, FastJSONRenderer nutzt das json-Modul.'))
+        count = options['rows']
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            request = RequestFactory().get('/api/products/')
+            products = FastProductHyperlinkedSerializer(request).to_representation(
+                {'id': i, 'name': f'Produkt {i}', 'description': 'Beschreibung ' * 5, 'price': Decimal(i % 10000) / 100,
+                 'market_id': i % 100 + 1, 'seller_id': i % 1000 + 1}
+                for i in range(1, count + 1)
+            )
+        sellers = [
+            {'id': i, 'name': f'Seller {i}', 'market_count': 3, 'markets': ['Wochenmarkt', 'Fischmarkt', 'Großmarkt'],
+             'contact_info': f'seller{i}@test.com'}
+            for i in range(1, count + 1)
+        ]
+        for name, data in [('products', {'next': None, 'previous': None, 'results': products}),
+                           ('sellers', {'next': None, 'previous': None, 'results': sellers})]:
+            drf_time, drf_body = self.measure(JSONRenderer().render, data)
+            fast_time, fast_body = self.measure(renderers.FastJSONRenderer().render, data)
+            self.stdout.write(
+                f'{name}: {len(drf_body) / 1e6:.1f} MB, DRF {drf_time:.3f}s, fast {fast_time:.3f}s, '
+                f'{drf_time / fast_time:.1f}x schneller, identische Ausgabe: {drf_body == fast_body}'
+            )
+
+    def measure(self, render, data):
+        start = time.perf_counter()
+        body = render(data)
+        return time.perf_counter() - start, body
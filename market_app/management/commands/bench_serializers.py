@@ -0,0 +1,48 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from market_app.api.fast import FastProductHyperlinkedSerializer, FastProductSerializer
+from market_app.api.serializers import ProductHyperlinkedSerializer, ProductSerializer
+from market_app.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: ProductSerializer/ProductHyperlinkedSerializer gegen die schnellen Serializer aus market_app/api/fast.py.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Anzahl Products (nur im Speicher, ohne Datenbank)')
+
+    def handle(self, *args, **options):
+        rows = [
+            {'id': i, 'name': f'Produkt{i}', 'description': 'Beschreibung ' * 5, 'price': Decimal(i % 10000) / 100,
+             'market_id': i % 100 + 1, 'seller_id': i % 1000 + 1}
+            for i in range(1, options['rows'] + 1)
+        ]
+        for row in rows:
+            row['price'] = row['price'].quantize(Decimal('0.01'))      # wie der Decimal-Converter von Django
+        products = [Product(**row) for row in rows]
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            request = RequestFactory().get('/api/products/')
+            self.compare('ProductSerializer', lambda: ProductSerializer(products, many=True).data,
+                         lambda: FastProductSerializer().to_representation(rows))
+            self.compare('ProductHyperlinkedSerializer', lambda: ProductHyperlinkedSerializer(products, many=True, context={'request': request}).data,
+                         lambda: FastProductHyperlinkedSerializer(request).to_representation(rows))
+
+    def compare(self, name, slow, fast):
+        slow_time, slow_data = self.measure(slow)
+        fast_time, fast_data = self.measure(fast)
+        identical = JSONRenderer().render(slow_data) == JSONRenderer().render(fast_data)
+        self.stdout.write(
+            f'{name}: DRF {slow_time:.2f}s, fast {fast_time:.2f}s, {slow_time / fast_time:.1f}x schneller, identische Ausgabe: {identical}'
+        )
+
+    def measure(self, serialize):
+        start = time.perf_counter()
+        data = serialize()
+        return time.perf_counter() - start, data
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: Lese-Durchsatz von SQLite bei gleichzeitigen Schreibzugriffen (Standard-Einstellungen vs. settings.SQLITE_PRAGMAS).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', default='1,2,4,8', help='Anzahl gleichzeitiger Leser (Komma-getrennt)')
+        parser.add_argument('--seconds', type=float, default=2.0, help='Dauer pro Messung')
+        parser.add_argument('--rows', type=int, default=20000, help='Anzahl Zeilen in der Test-Tabelle')
+
+    def handle(self, *args, **options):
+        readers = [int(value) for value in options['readers'].split(',')]
+        configs = {'default': {}, 'tuned': getattr(settings, 'SQLITE_PRAGMAS', {})}
+        self.stdout.write(f'{"config":<8} {"readers":>7} {"reads/s":>10} {"writes/s":>9} {"locked":>7}')
+        for name, pragmas in configs.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.create_database(path, pragmas, options['rows'])
+                for count in readers:
+                    reads, writes, locked = self.measure(path, pragmas, count, options['seconds'], options['rows'])
+                    self.stdout.write(f'{name:<8} {count:>7} {reads:>10.0f} {writes:>9.0f} {locked:>7}')
+
+    def connect(self, path, pragmas):
+        connection = sqlite3.connect(path, timeout=0.1, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def create_database(self, path, pragmas, rows):
+        connection = self.connect(path, pragmas)
+        connection.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, price REAL)')
+        connection.executemany('INSERT INTO product (name, price) VALUES (?, ?)', ((f'Produkt{i}', i % 100) for i in range(rows)))
+        connection.close()
+
+    def measure(self, path, pragmas, readers, seconds, rows):     # ein Schreiber und "readers" Leser laufen gleichzeitig
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+
+        def read():
+            connection = self.connect(path, pragmas)
+            index = 0
+            while not stop.is_set():
+                index = (index + 7919) % rows
+                try:
+                    connection.execute('SELECT id, name, price FROM product WHERE id > ? ORDER BY id LIMIT 50', (index,)).fetchall()
+                    count('reads')
+                except sqlite3.OperationalError:    # "database is locked"
+                    count('locked')
+            connection.close()
+
+        def write():
+            connection = self.connect(path, pragmas)
+            index = 0
+            while not stop.is_set():
+                index = (index + 1) % rows
+                try:
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.execute('UPDATE product SET price = price + 1 WHERE id = ?', (index + 1,))
+                    connection.execute('COMMIT')
+                    count('writes')
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    count('locked')
+            connection.close()
+
+        threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counts['reads'] / seconds, counts['writes'] / seconds, counts['locked']
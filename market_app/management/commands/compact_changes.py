@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from market_app import changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Verkleinert das Änderungsprotokoll (/api/changes/): pro Objekt bleibt nur die letzte Änderung erhalten. '
+        'Mit --max-age werden zusätzlich alle Einträge gelöscht, die älter als die angegebene Anzahl Tage sind '
+        '(Clients mit einer älteren seq bekommen dann 410 Gone und müssen komplett neu laden). Zum regelmäßigen Aufruf, z.B. per cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None, help='Einträge älter als so viele Tage löschen')
+
+    def handle(self, *args, **options):
+        if options['max_age'] is not None and options['max_age'] < 0:
+            raise CommandError('--max-age darf nicht negativ sein.')
+        start = time.perf_counter()
+        merged, expired = changes.compact(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Änderungsprotokoll verkleinert: {merged} zusammengefasst, {expired} abgelaufen ({time.perf_counter() - start:.2f}s).'
+        ))
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from market_app import catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        'Exportiert Markets, Sellers und Products als komprimierte NDJSON- oder CSV-Dateien (Shards). '
+        'Jede Tabelle wird in id-Bereiche aufgeteilt, die parallel in eigenen Prozessen geschrieben werden; '
+        'zum Schluss wird eine manifest.json geschrieben. Die Dateien können mit import_catalogue wieder eingelesen werden.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir')
+        parser.add_argument('--format', choices=catalogue.FORMATS, default='ndjson')
+        parser.add_argument('--models', nargs='+', choices=list(catalogue.MODELS), default=list(catalogue.MODELS))
+        parser.add_argument('--shard-size', type=int, default=100000, help='Größe eines id-Bereichs (= maximale Zeilen pro Datei)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Anzahl Prozesse (0 = alles im aktuellen Prozess)')
+        parser.add_argument('--no-compress', action='store_true', help='Dateien ohne gzip schreiben')
+
+    def handle(self, *args, **options):
+        if options['shard_size'] < 1:
+            raise CommandError('--shard-size muss mindestens 1 sein.')
+        output_dir, fmt = options['output_dir'], options['format']
+        os.makedirs(output_dir, exist_ok=True)
+        extension = f'.{fmt}' if options['no_compress'] else f'.{fmt}.gz'
+
+        tasks = []      # (model, start, end, path): ein Shard pro id-Bereich
+        for name in options['models']:
+            bounds = catalogue.MODELS[name].objects.aggregate(low=Min('id'), high=Max('id'))
+            if bounds['low'] is None:
+                continue
+            for index, start in enumerate(range(bounds['low'], bounds['high'] + 1, options['shard_size'])):
+                path = os.path.join(output_dir, f'{name}-{index:05d}{extension}')
+                tasks.append((name, start, start + options['shard_size'], path, fmt))
+
+        start_time = time.perf_counter()
+        if options['workers'] > 0:
+            connections.close_all()     # die Worker dürfen die Datenbank-Verbindung des Hauptprozesses nicht erben (fork)
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                shards = list(pool.map(catalogue.export_shard, *zip(*tasks))) if tasks else []
+        else:
+            shards = [catalogue.export_shard(*task) for task in tasks]
+        elapsed = time.perf_counter() - start_time
+
+        manifest = {'created_at': timezone.now().isoformat(), 'format': fmt, 'compressed': not options['no_compress'], 'models': {}}
+        for task, shard in zip(tasks, shards):
+            name = task[0]
+            if not shard['rows']:       # id-Bereich ohne Objekte (z.B. nach vielen Löschungen)
+                os.remove(os.path.join(output_dir, shard['file']))
+                continue
+            entry = manifest['models'].setdefault(name, {'rows': 0, 'shards': []})
+            entry['rows'] += shard['rows']
+            entry['shards'].append(shard)
+        with open(os.path.join(output_dir, 'manifest.json'), 'w') as file:
+            json.dump(manifest, file, indent=2)
+
+        rows = sum(entry['rows'] for entry in manifest['models'].values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows} Zeilen in {sum(len(entry["shards"]) for entry in manifest["models"].values())} Dateien exportiert '
+            f'in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} Zeilen/s).'
+        ))
@@ -0,0 +1,154 @@
+import itertools
+import json
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries, transaction
+
+from market_app import catalogue, changes, stats
+from market_app.models import Market, MarketStats, Seller
+from market_app.signals import invalidate_on_commit, memberships_changed, related_changed
+
+
+class Command(BaseCommand):
+    help = (
+        'Importiert Markets, Sellers oder Products aus einer CSV- oder NDJSON-Datei (auch *.gz) in bulk_create-Batches. '
+        'Nach jedem Batch wird ein Checkpoint geschrieben, ein abgebrochener Import macht beim nächsten Aufruf dort weiter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=list(catalogue.MODELS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=catalogue.FORMATS, help='Standard: anhand der Dateiendung (.csv, .ndjson, .jsonl, jeweils optional .gz)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Zeilen pro bulk_create und pro Transaktion')
+        parser.add_argument('--lookup', choices=['id', 'name'], default='id', help='Referenzen auf Markets/Sellers über die id oder den Namen')
+        parser.add_argument('--checkpoint', help='Standard: <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true', help='einen vorhandenen Checkpoint ignorieren und von vorne beginnen')
+        parser.add_argument('--progress-interval', type=float, default=5.0, help='Sekunden zwischen den Fortschrittsmeldungen')
+
+    def handle(self, *args, **options):
+        name, path = options['model'], options['path']
+        fmt = options['format'] or catalogue.detect_format(path)
+        if fmt is None:
+            raise CommandError(f'Unbekanntes Format für {path}, bitte --format angeben.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size muss mindestens 1 sein.')
+        self.model, self.fields = catalogue.MODELS[name], catalogue.FIELDS[name]
+        self.id_maps = {     # für die Referenzen: EINE Abfrage pro Model, danach nur noch Dictionary-Zugriffe
+            field: self.id_map(model, options['lookup'])
+            for field, model in [('market', Market), ('markets', Market), ('seller', Seller)] if field in self.fields
+        }
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        skip = 0 if options['restart'] else self.read_checkpoint(checkpoint, path)
+        if skip:
+            self.stdout.write(f'Checkpoint gefunden, die ersten {skip} Zeilen werden übersprungen.')
+
+        self.upserted = False
+        done, start, last_report = skip, time.perf_counter(), time.perf_counter()
+        with catalogue.open_text(path) as file:
+            rows = itertools.islice(enumerate(catalogue.read_rows(file, fmt), 1), skip, None)   # übersprungene Zeilen werden nur gelesen, nicht gespeichert
+            while True:
+                batch = [self.build(number, row) for number, row in itertools.islice(rows, options['batch_size'])]
+                if not batch:
+                    break
+                self.save(batch)
+                reset_queries()     # mit DEBUG = True merkt sich Django jede Abfrage (sonst wächst der Speicher mit der Dateigröße)
+                done += len(batch)
+                self.write_checkpoint(checkpoint, path, done)
+                now = time.perf_counter()
+                if now - last_report >= options['progress_interval']:
+                    self.stdout.write(f'{done} Zeilen, {(done - skip) / (now - start):.0f} Zeilen/s')
+                    last_report = now
+
+        if self.upserted and name != 'market':     # vorhandene Products/Verbindungen wurden überschrieben, die Differenzen sind unbekannt
+            stats.rebuild()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{done - skip} Zeilen importiert in {elapsed:.2f}s ({(done - skip) / elapsed if elapsed else 0:.0f} Zeilen/s).'
+        ))
+
+    def id_map(self, model, lookup):        # Referenz (als String, so steht sie in der CSV-Datei) -> id
+        return {str(key): pk for key, pk in model.objects.values_list(lookup, 'id').iterator()}
+
+    def resolve(self, number, field, value):
+        pk = self.id_maps[field].get(str(value))
+        if pk is None:
+            raise CommandError(f'Zeile {number}: {field} "{value}" nicht vorhanden.')
+        return pk
+
+    def build(self, number, row):       # wandelt eine Zeile in ein (nicht gespeichertes) Objekt um und prüft die Werte
+        if not isinstance(row, dict):
+            raise CommandError(f'Zeile {number}: erwartet ein Objekt mit den Feldern {", ".join(self.fields)}.')
+        data, market_ids = {}, []
+        if row.get('id') not in (None, ''):
+            data['id'] = self.clean(number, 'id', row['id'])
+        for field in self.fields:
+            if field not in row:
+                raise CommandError(f'Zeile {number}: Feld "{field}" fehlt.')
+            if field == 'markets':
+                market_ids = [self.resolve(number, field, value) for value in row[field]]
+            elif field in ('market', 'seller'):
+                data[f'{field}_id'] = self.resolve(number, field, row[field])
+            else:
+                data[field] = self.clean(number, field, row[field])
+        instance = self.model(**data)
+        instance._import_market_ids = market_ids
+        return instance
+
+    def clean(self, number, field, value):
+        try:
+            return self.model._meta.get_field(field).clean(value, None)     # wie die Validierung im Serializer (Länge, Dezimalstellen, ...)
+        except ValidationError as error:
+            raise CommandError(f'Zeile {number}: {field}: {" ".join(error.messages)}')
+
+    def save(self, batch):      # ein Batch = eine Transaktion (der Checkpoint wird erst danach geschrieben)
+        upsert = any(instance.pk is not None for instance in batch)    # Zeilen mit id überschreiben vorhandene Objekte
+        self.upserted |= upsert
+        fields = [field for field in self.fields if field != 'markets']
+        with transaction.atomic():
+            if upsert:
+                self.model.objects.bulk_create(
+                    batch, update_conflicts=True, unique_fields=['id'],
+                    update_fields=[f'{field}_id' if field in ('market', 'seller') else field for field in fields] + ['updated_at'],
+                )
+                invalidate_on_commit(self.model, [instance.pk for instance in batch])
+            else:
+                self.model.objects.bulk_create(batch)
+            changes.record('update' if upsert else 'create', self.model, [instance.pk for instance in batch])
+            getattr(self, f'save_{self.model._meta.model_name}')(batch, upsert)
+
+    def save_market(self, batch, upsert):
+        MarketStats.objects.bulk_create((MarketStats(market_id=market.pk) for market in batch), ignore_conflicts=True)
+        if upsert:      # die Seller zeigen die Namen ihrer Markets an
+            related_changed(Seller, Seller.markets.through.objects.filter(market_id__in=[market.pk for market in batch]).values_list('seller_id', flat=True))
+
+    def save_seller(self, batch, upsert):
+        through = Seller.markets.through
+        memberships = [through(seller_id=seller.pk, market_id=market_id) for seller in batch for market_id in seller._import_market_ids]
+        through.objects.bulk_create(memberships, ignore_conflicts=True)
+        if memberships:
+            memberships_changed.send(
+                sender=Seller, seller_ids={row.seller_id for row in memberships}, market_ids={row.market_id for row in memberships}
+            )
+
+    def save_product(self, batch, upsert):
+        if not upsert:      # bulk_create löst keine Signals aus (bei upsert wird die Statistik am Ende neu berechnet)
+            stats.add_products((product.market_id, 1, product.price) for product in batch)
+
+    def read_checkpoint(self, checkpoint, path):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as file:
+            data = json.load(file)
+        if data.get('path') != os.path.abspath(path):
+            raise CommandError(f'Der Checkpoint {checkpoint} gehört zu {data.get("path")}, bitte --restart oder --checkpoint angeben.')
+        return data['rows']
+
+    def write_checkpoint(self, checkpoint, path, rows):     # erst in eine temporäre Datei schreiben, damit ein Abbruch keinen halben Checkpoint hinterlässt
+        with open(f'{checkpoint}.tmp', 'w') as file:
+            json.dump({'path': os.path.abspath(path), 'rows': rows}, file)
+        os.replace(f'{checkpoint}.tmp', checkpoint)
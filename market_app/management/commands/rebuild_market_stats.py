@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from market_app import stats
+
+
+class Command(BaseCommand):
+    help = 'Berechnet die Statistik (MarketStats) aller Markets komplett neu, z.B. nach Änderungen direkt in der Datenbank.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Market-Statistik neu berechnet ({time.perf_counter() - start:.2f}s).'))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from market_app import search
+
+
+class Command(BaseCommand):
+    help = 'Baut den Volltextindex (FTS5) für Products und Markets komplett neu auf.'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Die Volltextsuche ist nur mit SQLite (FTS5) verfügbar.')
+        start = time.perf_counter()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Suchindex neu aufgebaut ({time.perf_counter() - start:.2f}s).'))
@@ -0,0 +1,144 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+# Histogramme pro Route und HTTP-Methode (Ausgabe unter /metrics im Prometheus-Textformat).
+# Jeder Thread zählt in sein eigenes Dictionary (kein Lock pro Request), erst beim Abrufen wird zusammengezählt.
+# Die Dictionaries beendeter Threads (z.B. von sync_to_async unter ASGI) werden in self.retired übernommen und entfernt.
+# Mit mehreren Prozessen (gunicorn) schreibt jeder Prozess regelmäßig eine Datei metrics-<pid>.json nach settings.METRICS_DIR.
+
+HISTOGRAMS = {      # Name: (Beschreibung, obere Grenzen der Buckets)
+    'api_request_duration_seconds': ('Dauer der Requests in Sekunden', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'api_request_queries': ('SQL-Abfragen pro Request', (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)),
+    'api_response_bytes': ('Größe der Antwort in Bytes', (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)),
+}
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()        # nur beim ersten Zugriff eines Threads und beim Abrufen
+        self.local = threading.local()
+        self.stores = []        # (weakref auf den Thread, Dictionary) der laufenden Threads: (name, labels) -> [Anzahl pro Bucket..., Anzahl +Inf, Summe]
+        self.retired = {}       # zusammengezählte Werte der beendeten Threads
+        self.next_flush = 0.0
+
+    def store(self):
+        store = getattr(self.local, 'store', None)
+        if store is None:
+            store = self.local.store = {}
+            with self.lock:
+                self.prune()
+                self.stores.append((weakref.ref(threading.current_thread()), store))
+        return store
+
+    def prune(self):        # nur mit self.lock: ein beendeter Thread schreibt nicht mehr in sein Dictionary
+        running = []
+        for thread_ref, store in self.stores:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                running.append((thread_ref, store))
+            else:
+                for key, values in store.items():
+                    merge(self.retired, key, values)
+        self.stores = running
+
+    def observe(self, name, labels, value):     # labels: Tupel von (Name, Wert), z.B. (('route', 'product-list'), ('method', 'GET'))
+        buckets = HISTOGRAMS[name][1]
+        store = self.store()
+        values = store.get((name, labels))
+        if values is None:
+            values = store[(name, labels)] = [0] * (len(buckets) + 2)
+        values[bisect_left(buckets, value)] += 1        # Index len(buckets) = größer als alle Grenzen (+Inf)
+        values[-1] += value
+        if self.directory() and time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def snapshot(self):     # alle Threads dieses Prozesses zusammengezählt
+        with self.lock:
+            self.prune()
+            stores = [store for thread_ref, store in self.stores]
+            merged = {key: list(values) for key, values in self.retired.items()}
+        for store in stores:
+            for key, values in list(store.items()):
+                merge(merged, key, values)
+        return merged
+
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def path(self, pid=None):
+        return os.path.join(self.directory(), f'metrics-{pid or os.getpid()}.json')
+
+    def flush(self):        # schreibt den Stand dieses Prozesses für die anderen Prozesse (erst temporär, dann umbenennen)
+        self.next_flush = time.monotonic() + getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0)
+        path = self.path()
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump([[name, labels, values] for (name, labels), values in self.snapshot().items()], file)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):      # dieser Prozess (aktueller Stand) + die Dateien der anderen Prozesse
+        merged = self.snapshot()
+        if self.directory():
+            own = self.path()
+            for path in glob.glob(os.path.join(self.directory(), 'metrics-*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as file:
+                        rows = json.load(file)
+                except (OSError, ValueError):       # gerade von einem anderen Prozess ersetzt
+                    continue
+                for name, labels, values in rows:
+                    merge(merged, (name, tuple(tuple(label) for label in labels)), values)
+        return merged
+
+    def render(self):       # Prometheus-Textformat (Version 0.0.4)
+        merged = self.collect()
+        lines = []
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+            for (metric, labels), values in sorted(merged.items()):
+                if metric != name:
+                    continue
+                label_text = ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label_text}}} {values[-1]}')
+                lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def merge(merged, key, values):
+    current = merged.get(key)
+    if current is None:
+        merged[key] = list(values)
+    else:
+        for index, value in enumerate(values):
+            current[index] += value
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+@atexit.register
+def flush_on_exit():        # damit die letzten Requests eines beendeten Workers nicht verloren gehen
+    if registry.directory():
+        try:
+            registry.flush()
+        except OSError:
+            pass
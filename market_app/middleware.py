@@ -0,0 +1,208 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from market_app.metrics import registry
+
+
+logger = logging.getLogger('market_app.timing')
+
+# Die Middlewares zählen die SQL-Abfragen über EINEN execute_wrapper pro Datenbank-Verbindung, der die Abfragen an die
+# Recorder des aktuellen Requests weitergibt. Die Recorder stehen in einer ContextVar: die wird auch in die Threads von
+# sync_to_async übernommen (async ORM unter ASGI), ein connection.execute_wrapper() gilt dagegen nur im eigenen Thread.
+active_recorders = ContextVar('active_recorders', default=())
+
+
+def execute_recorded(execute, sql, params, many, context):
+    recorders = active_recorders.get()
+    if not recorders or sql.startswith('PRAGMA'):      # PRAGMAs beim Öffnen einer Verbindung (market_app/db.py) gehören zu keinem Request
+        return execute(sql, params, many, context)
+    for recorder in recorders:
+        execute = partial(recorder, execute)
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if execute_recorded not in connection.execute_wrappers:     # bei einer neuen Verbindung desselben Alias (CONN_MAX_AGE) bleibt der Wrapper erhalten
+        connection.execute_wrappers.append(execute_recorded)
+
+
+@contextmanager
+def recording(recorder):        # alle Abfragen in diesem Kontext an recorder geben (auch in den Threads von sync_to_async)
+    token = active_recorders.set((*active_recorders.get(), recorder))
+    try:
+        yield recorder
+    finally:
+        active_recorders.reset(token)
+
+
+class QueryRecorder:        # wird per connection.execute_wrapper() um jede SQL-Abfrage gelegt
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()     # gleiches SQL (mit Platzhaltern) mehrfach = typisches N+1 Muster
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+
+class RequestTimingMiddleware:      # misst pro Request: Anzahl SQL-Abfragen, DB-Zeit, View-Zeit (ohne DB), Render-Zeit -> Server-Timing Header + Log-Zeile
+    sync_capable = True
+    async_capable = True        # unter ASGI laufen async Views (z.B. /api/events/) ohne Umweg über einen Thread
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+        self.duplicate_threshold = getattr(settings, 'REQUEST_TIMING_DUPLICATE_THRESHOLD', 2)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:     # nicht gemessene Requests kosten nur diesen einen Vergleich
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._timing = {'start': time.perf_counter()}
+        with recording(recorder):       # alle Verbindungen, d.h. "default" und "read" (siehe market_app/db.py)
+            response = self.get_response(request)
+        self.report(request, response, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._timing = {'start': time.perf_counter()}
+        with recording(recorder):
+            response = await self.get_response(request)
+        self.report(request, response, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_timing'):
+            request._timing['view'] = time.perf_counter()
+            request._timing['view_name'] = getattr(view_func, '__qualname__', view_func.__class__.__name__)
+
+    def process_template_response(self, request, response):    # wird direkt vor response.render() aufgerufen (DRF Response = TemplateResponse)
+        timing = getattr(request, '_timing', None)
+        if timing is not None:
+            timing['render'] = time.perf_counter()
+            response.add_post_render_callback(lambda response: timing.__setitem__('rendered', time.perf_counter()))
+        return response
+
+    def report(self, request, response, recorder):
+        timing = request._timing
+        end = time.perf_counter()
+        view_end = timing.get('render', end)
+        metrics = {
+            'db': recorder.duration,
+            'view': max(view_end - timing.get('view', view_end) - recorder.duration, 0.0),      # View-Code ohne DB, bei DRF vor allem die Serializer
+            'render': timing.get('rendered', view_end) - view_end,
+            'total': end - timing['start'],
+        }
+        duplicates = {sql: count for sql, count in recorder.statements.items() if count >= self.duplicate_threshold}
+
+        entries = [f'db;dur={metrics["db"] * 1000:.1f};desc="{recorder.count} queries"']
+        entries += [f'{name};dur={metrics[name] * 1000:.1f}' for name in ('view', 'render', 'total')]
+        if duplicates:
+            entries.append(f'dup;desc="{len(duplicates)} repeated statements"')
+        response['Server-Timing'] = ', '.join(entries)
+
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'view': timing.get('view_name'),
+            'status': response.status_code,
+            'queries': recorder.count,
+            **{f'{name}_ms': round(value * 1000, 2) for name, value in metrics.items()},
+        }
+        if duplicates:
+            line['duplicates'] = [{'sql': sql[:200], 'count': count} for sql, count in sorted(duplicates.items(), key=lambda item: -item[1])]
+            logger.warning(json.dumps(line))
+        else:
+            logger.info(json.dumps(line))
+
+
+class QueryCounter:     # nur zählen (für jeden Request, daher so wenig Arbeit wie möglich)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:        # Histogramme für Dauer, SQL-Abfragen und Größe der Antwort pro Route und Methode (siehe market_app/metrics.py)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with recording(counter):
+            response = self.get_response(request)
+        return self.observe(request, response, counter, start)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with recording(counter):
+            response = await self.get_response(request)
+        return self.observe(request, response, counter, start)
+
+    def observe(self, request, response, counter, start):
+        match = request.resolver_match     # Name des URL-Patterns (z.B. "product-list"), sonst das Pattern selbst (z.B. "api/market/<int:pk>/sellers/")
+        labels = (('route', (match.url_name or match.route) if match else 'unmatched'), ('method', request.method))
+        registry.observe('api_request_duration_seconds', labels, time.perf_counter() - start)
+        registry.observe('api_request_queries', labels, counter.count)
+        if response.streaming:      # die Größe ist erst bekannt, wenn alles gesendet wurde
+            count_bytes = self.acount_bytes if response.is_async else self.count_bytes
+            response.streaming_content = count_bytes(response.streaming_content, labels)
+        else:
+            registry.observe('api_response_bytes', labels, len(response.content))
+        return response
+
+    def count_bytes(self, content, labels):
+        size = 0
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+        registry.observe('api_response_bytes', labels, size)
+
+    async def acount_bytes(self, content, labels):     # für async StreamingHttpResponse (z.B. unter ASGI)
+        size = 0
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+        registry.observe('api_response_bytes', labels, size)
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:05
+
+from django.db import migrations
+
+
+# FTS5-Volltextindex (nur SQLite) für Product (name, description) und Market (name, location, description).
+# "External content": der Index speichert nur die Tokens, die Daten bleiben in den normalen Tabellen.
+# Die Trigger halten den Index bei jedem INSERT/UPDATE/DELETE aktuell (auch bei bulk_create/bulk_update).
+
+SEARCH_TABLES = {
+    'market_app_product': ['name', 'description'],
+    'market_app_market': ['name', 'location', 'description'],
+}
+
+
+def create_sql(table, columns):
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",     # bereits vorhandene Daten indexieren
+    ]
+
+
+def drop_sql(table, columns):
+    fts = f'{table}_fts'
+    return [f'DROP TRIGGER IF EXISTS {fts}_{suffix}' for suffix in ('ai', 'ad', 'au')] + [f'DROP TABLE IF EXISTS {fts}']
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, columns in SEARCH_TABLES.items():
+        for sql in create_sql(table, columns):
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, columns in SEARCH_TABLES.items():
+        for sql in drop_sql(table, columns):
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0003_product_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
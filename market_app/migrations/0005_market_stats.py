@@ -0,0 +1,51 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def create_market_stats(apps, schema_editor):       # füllt die Tabelle für die bereits vorhandenen Markets
+    Market = apps.get_model('market_app', 'Market')
+    Seller = apps.get_model('market_app', 'Seller')
+    Product = apps.get_model('market_app', 'Product')
+    MarketStats = apps.get_model('market_app', 'MarketStats')
+    products = {
+        row['market_id']: row
+        for row in Product.objects.order_by().values('market_id').annotate(count=Count('id'), total=Sum('price'))
+    }
+    sellers = dict(Seller.markets.through.objects.order_by().values('market_id').annotate(count=Count('id')).values_list('market_id', 'count'))
+    MarketStats.objects.bulk_create(
+        (
+            MarketStats(
+                market_id=market_id,
+                product_count=products.get(market_id, {}).get('count', 0),
+                price_total=products.get(market_id, {}).get('total') or 0,
+                seller_count=sellers.get(market_id, 0),
+            )
+            for market_id in Market.objects.values_list('id', flat=True).iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_count', models.IntegerField(default=0)),
+                ('seller_count', models.IntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=60)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('market', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='market_app.market')),
+            ],
+        ),
+        migrations.RunPython(create_market_stats, migrations.RunPython.noop),
+    ]
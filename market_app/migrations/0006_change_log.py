@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0005_market_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('op', models.CharField(choices=[('create', 'create'), ('update', 'update'), ('delete', 'delete'), ('compact', 'compact')], max_length=10)),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'object_id'], name='change_object_idx')],
+            },
+        ),
+    ]
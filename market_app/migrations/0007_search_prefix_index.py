@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+# Die FTS5-Tabellen aus 0004_search_index bekommen zusätzlich Präfix-Indizes für 2 und 3 Zeichen (prefix='2 3'):
+# kurze Präfix-Suchen ("ap"*) lesen dann einen fertigen Eintrag statt alle passenden Tokens zusammenzusuchen.
+# Die Optionen einer FTS5-Tabelle lassen sich nicht ändern, daher wird sie neu angelegt (die Trigger bleiben unverändert).
+
+SEARCH_TABLES = {
+    'market_app_product': ['name', 'description'],
+    'market_app_market': ['name', 'location', 'description'],
+}
+
+
+def recreate(schema_editor, prefix):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, columns in SEARCH_TABLES.items():
+        fts = f'{table}_fts'
+        options = f", prefix='{prefix}'" if prefix else ''
+        schema_editor.execute(f'DROP TABLE {fts}')
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(columns)}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2'{options})"
+        )
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def add_prefix_index(apps, schema_editor):
+    recreate(schema_editor, '2 3')
+
+
+def remove_prefix_index(apps, schema_editor):
+    recreate(schema_editor, None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0006_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_prefix_index, remove_prefix_index),
+    ]
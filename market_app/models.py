@@ -6,15 +6,23 @@ class Market(models.Model):
     location = models.CharField(max_length=255)
     description = models.TextField()
     net_worth = models.DecimalField(max_digits=100, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)     # wird bei jedem save() gesetzt (für ETag/ Last-Modified), db_index für Max('updated_at')
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):      # wie bei Product: beim Speichern erkennen, ob sich der Name geändert hat (siehe signals.market_saved)
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 class Seller(models.Model):
     name = models.CharField(max_length=255)
     contact_info = models.TextField()
     markets = models.ManyToManyField(Market, related_name='sellers')        # related_name: Name, mit dem wir vom Market darauf zugreifen (ein Seller kann zu mehreren Markets gehören!)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -26,6 +34,47 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=50, decimal_places=2)
     market = models.ForeignKey(Market, on_delete=models.CASCADE, related_name='products')   # ein Product hat nur einen Market! (aber ein Market kann mehrere Products haben!)
     seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='products')   # ein Product hat nur einen Seller! (aber ein Seller kann mehrere Products haben!)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [     # für die Filter und Sortierungen in /api/products/ (siehe market_app/api/filters.py)
+            models.Index(fields=['market', 'price'], name='product_market_price_idx'),
+            models.Index(fields=['seller', 'price'], name='product_seller_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['name'], name='product_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.price})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):      # merkt sich die Werte aus der Datenbank (um beim Speichern zu erkennen, was sich geändert hat)
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class MarketStats(models.Model):    # zusammengefasste Zahlen pro Market (wird per Signals aktuell gehalten, siehe market_app/stats.py)
+    market = models.OneToOneField(Market, on_delete=models.CASCADE, related_name='stats')
+    product_count = models.IntegerField(default=0)
+    seller_count = models.IntegerField(default=0)
+    price_total = models.DecimalField(max_digits=60, decimal_places=2, default=0)     # Summe aller Product-Preise (Durchschnitt = price_total / product_count)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats {self.market_id}"
+
+
+class Change(models.Model):     # Änderungsprotokoll für /api/changes/ (nur anhängen, wird per Signals gefüllt, siehe market_app/changes.py)
+    OPERATIONS = [('create', 'create'), ('update', 'update'), ('delete', 'delete'), ('compact', 'compact')]
+    seq = models.BigAutoField(primary_key=True)     # fortlaufende Nummer (SQLite: AUTOINCREMENT, wird auch nach dem Löschen nie wiederverwendet)
+    op = models.CharField(max_length=10, choices=OPERATIONS)
+    model = models.CharField(max_length=20)     # 'market', 'seller' oder 'product'
+    object_id = models.BigIntegerField()        # bei op='compact': bis zu dieser seq wurden Einträge gelöscht (siehe compact_changes)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'object_id'], name='change_object_idx')]    # für die Zusammenfassung pro Objekt
+
+    def __str__(self):
+        return f"{self.seq}: {self.op} {self.model} {self.object_id}"
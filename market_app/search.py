@@ -0,0 +1,49 @@
+import re
+
+from django.db import connection, connections, router
+
+from market_app.models import Product
+
+
+# Volltextsuche über die FTS5-Tabellen aus der Migration 0004_search_index (nur mit SQLite verfügbar!)
+
+SEARCH_TABLES = {       # Typ des Treffers -> FTS5-Tabelle
+    'product': 'market_app_product_fts',
+    'market': 'market_app_market_fts',
+}
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+MIN_PREFIX_LENGTH = 2      # kürzere Wörter nur exakt suchen ("a"* würde fast jedes Token treffen), 2 und 3 Zeichen haben einen Präfix-Index (Migration 0007)
+
+
+def fts_query(text):    # macht aus der Eingabe eine gültige FTS5-Abfrage: jedes Wort als Präfix ("apf"* findet auch "Apfelsaft"), alle Wörter müssen vorkommen
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' if len(word) >= MIN_PREFIX_LENGTH else f'"{word}"' for word in words)
+
+
+def search(text, types, limit, offset=0):     # gibt eine Liste von (typ, id, rank) zurück, der beste Treffer zuerst (kleinster bm25-Wert)
+    query = fts_query(text)
+    if not query:
+        return []
+    parts = []
+    params = []
+    for kind in types:
+        table = SEARCH_TABLES[kind]
+        # jede Tabelle liefert nur ihre besten (offset + limit) Treffer, FTS5 sortiert "ORDER BY rank" direkt im Index
+        parts.append(f"SELECT * FROM (SELECT '{kind}' AS kind, rowid AS id, rank FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s)")
+        params += [query, offset + limit]
+    sql = ' UNION ALL '.join(parts) + ' ORDER BY rank LIMIT %s OFFSET %s'
+    with connections[router.db_for_read(Product)].cursor() as cursor:     # Lesezugriff: über "read" (siehe market_app/db.py), in Transaktionen über "default"
+        cursor.execute(sql, params + [limit, offset])
+        return cursor.fetchall()
+
+
+def rebuild():      # baut alle Indizes komplett aus den Tabellen neu auf (z.B. nach einem Import ohne Trigger)
+    with connection.cursor() as cursor:
+        for table in SEARCH_TABLES.values():
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")    # fasst die Index-Segmente zusammen (schnellere Abfragen)
@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from market_app import changes, stats
+from market_app.api import cache
+from market_app.models import Market, MarketStats, Seller, Product
+
+
+memberships_changed = Signal()      # wird EINMAL pro Bulk-Änderung der Seller-Market-Verbindungen gesendet (Argumente: seller_ids, market_ids)
+
+
+def invalidate_on_commit(model, pks):   # erst nach dem Commit ungültig machen, sonst könnte ein anderer Request noch die alten Daten cachen
+    pks = set(pks)
+    if pks:
+        transaction.on_commit(lambda: cache.invalidate(model, pks))
+
+
+def related_changed(model, pks):        # für Objekte, deren Daten sich durch ein ANDERES Objekt geändert haben (z.B. die Links zu den Sellern eines Markets)
+    pks = set(pks)
+    if pks:
+        model.objects.filter(pk__in=pks).update(updated_at=timezone.now())    # update() löst keine Signals aus, ändert aber ETag/ Last-Modified
+        invalidate_on_commit(model, pks)
+        changes.record('update', model, pks)
+
+
+def market_renamed(instance, update_fields):     # die Seller zeigen nur die Namen ihrer Markets an, alle anderen Felder betreffen sie nicht
+    if update_fields is not None and 'name' not in update_fields:
+        return False
+    loaded = getattr(instance, '_loaded_values', {})
+    return 'name' not in loaded or loaded['name'] != instance.name      # alter Name unbekannt (z.B. per only() geladen) -> sicherheitshalber ja
+
+
+@receiver(post_save, sender=Market)
+def market_saved(sender, instance, created, update_fields, **kwargs):
+    changes.record('create' if created else 'update', Market, [instance.pk])
+    if created:
+        MarketStats.objects.create(market=instance)
+    else:
+        invalidate_on_commit(Market, [instance.pk])
+        if market_renamed(instance, update_fields):     # sonst würde z.B. jede Änderung von net_worth ALLE Seller des Markets neu schreiben
+            related_changed(Seller, instance.sellers.values_list('id', flat=True))
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), 'name': instance.name}
+
+
+@receiver(pre_delete, sender=Market)
+def market_deleting(sender, instance, **kwargs):    # vor dem Löschen, danach gibt es die Verbindungen zu den Sellern nicht mehr
+    invalidate_on_commit(Market, [instance.pk])
+    stats.market_deleting(instance.pk)
+    related_changed(Seller, instance.sellers.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Market)
+def market_deleted(sender, instance, **kwargs):
+    changes.record('delete', Market, [instance.pk])
+
+
+@receiver(post_save, sender=Seller)
+def seller_saved(sender, instance, created, **kwargs):
+    changes.record('create' if created else 'update', Seller, [instance.pk])
+    if not created:
+        invalidate_on_commit(Seller, [instance.pk])
+
+
+@receiver(pre_delete, sender=Seller)
+def seller_deleting(sender, instance, **kwargs):
+    instance._market_ids = set(instance.markets.values_list('id', flat=True))
+    invalidate_on_commit(Seller, [instance.pk])
+    related_changed(Market, instance._market_ids)    # die Markets enthalten die Links zu ihren Sellern!
+
+
+@receiver(post_delete, sender=Seller)
+def seller_deleted(sender, instance, **kwargs):     # erst nach dem Löschen sind die Verbindungen zu den Markets entfernt
+    changes.record('delete', Seller, [instance.pk])
+    stats.recompute_sellers(getattr(instance, '_market_ids', set()))
+
+
+@receiver(m2m_changed, sender=Seller.markets.through)
+def seller_markets_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action == 'pre_clear':      # bei clear() gibt es kein pk_set, daher vorher merken, welche Objekte verbunden waren
+        related = instance.markets if not reverse else instance.sellers
+        instance._cleared_pks = set(related.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_pks', set())
+    related_changed(type(instance), [instance.pk])     # reverse=False: instance ist ein Seller, sonst ein Market
+    related_changed(model, pk_set)
+    stats.recompute_sellers(pk_set if not reverse else [instance.pk])
+
+
+@receiver(memberships_changed)
+def memberships_bulk_changed(sender, seller_ids, market_ids, **kwargs):     # wie seller_markets_changed, aber für alle Seller/Markets zusammen
+    with changes.batched():
+        related_changed(Seller, seller_ids)
+        related_changed(Market, market_ids)
+    stats.recompute_sellers(market_ids)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    invalidate_on_commit(Product, [instance.pk])
+    changes.record('create' if created else 'update', Product, [instance.pk])
+    stats.product_saved(instance, created)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    invalidate_on_commit(Product, [instance.pk])
+    changes.record('delete', Product, [instance.pk])
+    stats.product_deleted(instance)
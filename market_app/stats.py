@@ -0,0 +1,105 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from threading import local
+
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from market_app.models import Market, MarketStats, Product, Seller
+
+
+# Pflege der Tabelle MarketStats: Änderungen an Products werden als Differenz (+/-) verbucht,
+# die Anzahl der Seller wird für die betroffenen Markets mit einer Abfrage neu gezählt.
+
+
+_batch = local()
+
+
+@contextmanager
+def batched():      # sammelt alle Änderungen (z.B. die post_delete Signals von queryset.delete()) und schreibt sie am Ende mit EINEM UPDATE
+    if getattr(_batch, 'changes', None) is not None:    # bereits in einem batched()-Block
+        yield
+        return
+    _batch.changes = []
+    _batch.deleted_markets = set()
+    try:
+        yield
+        changes = [change for change in _batch.changes if change[0] not in _batch.deleted_markets]
+    finally:
+        _batch.changes = None
+        _batch.deleted_markets = None
+    add_products(changes)
+
+
+def market_deleting(market_id):     # im batched()-Block: die Products dieses Markets nicht mehr verbuchen (seine Statistik wird mitgelöscht)
+    if getattr(_batch, 'changes', None) is not None:
+        _batch.deleted_markets.add(market_id)
+
+
+def add_products(changes):      # changes: Liste von (market_id, Anzahl, Preis), z.B. (3, 1, Decimal('1.50')) für ein neues Product
+    if getattr(_batch, 'changes', None) is not None:
+        _batch.changes.extend(changes)
+        return
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for market_id, count, price in changes:
+        deltas[market_id][0] += count
+        deltas[market_id][1] += count * Decimal(str(price))     # price kann auch ein String/float sein (z.B. Product.objects.create(price='1.50'))
+    deltas = {market_id: delta for market_id, delta in deltas.items() if delta[0] or delta[1]}
+    if deltas:      # EIN UPDATE für alle Markets (CASE WHEN market_id = ... THEN ...)
+        MarketStats.objects.filter(market_id__in=deltas).update(
+            product_count=F('product_count') + Case(*(When(market_id=market_id, then=Value(count)) for market_id, (count, total) in deltas.items())),
+            price_total=F('price_total') + Case(
+                *(When(market_id=market_id, then=Value(total)) for market_id, (count, total) in deltas.items()), output_field=DecimalField()
+            ),
+            updated_at=timezone.now(),
+        )
+
+
+def product_saved(product, created):
+    if created:
+        add_products([(product.market_id, 1, product.price)])
+    else:
+        loaded = getattr(product, '_loaded_values', {})
+        old_market_id, old_price = loaded.get('market_id'), loaded.get('price')
+        if not isinstance(old_market_id, int) or not isinstance(old_price, Decimal):    # alte Werte unbekannt (z.B. per only() geladen)
+            recompute_products({product.market_id})
+        elif old_market_id != product.market_id or old_price != Decimal(str(product.price)):
+            add_products([(old_market_id, -1, old_price), (product.market_id, 1, product.price)])
+    product._loaded_values = {'market_id': product.market_id, 'price': Decimal(str(product.price))}
+
+
+def product_deleted(product):
+    add_products([(product.market_id, -1, product.price)])
+
+
+def recompute_products(market_ids):     # zählt Products und Preissumme der Markets komplett neu (eine UPDATE-Abfrage)
+    products = Product.objects.filter(market_id=OuterRef('market_id')).order_by().values('market_id')
+    MarketStats.objects.filter(market_id__in=market_ids).update(
+        product_count=Coalesce(Subquery(products.annotate(count=Count('id')).values('count'), output_field=IntegerField()), 0),
+        price_total=Coalesce(
+            Subquery(products.annotate(total=Sum('price')).values('total'), output_field=DecimalField()),
+            Value(Decimal(0)), output_field=DecimalField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def recompute_sellers(market_ids):      # zählt die Seller der Markets neu (über den Index der Zwischentabelle Seller.markets)
+    memberships = Seller.markets.through.objects.filter(market_id=OuterRef('market_id')).order_by().values('market_id')
+    MarketStats.objects.filter(market_id__in=market_ids).update(
+        seller_count=Coalesce(Subquery(memberships.annotate(count=Count('id')).values('count'), output_field=IntegerField()), 0),
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild():      # baut die komplette Tabelle neu auf (fehlende Zeilen werden angelegt)
+    existing = MarketStats.objects.values('market_id')
+    MarketStats.objects.bulk_create(
+        (MarketStats(market_id=market_id) for market_id in Market.objects.exclude(id__in=existing).values_list('id', flat=True).iterator()),
+        batch_size=500,
+    )
+    market_ids = Market.objects.values('id')
+    recompute_products(market_ids)
+    recompute_sellers(market_ids)
@@ -1,3 +1,1229 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from market_app import catalogue, changes, middleware, search, signals, stats
+from market_app.api import cache, events, throttling
+from market_app.benchmarks import generator, scenarios
+from market_app.api.fast import FastProductHyperlinkedSerializer, FastProductSerializer
+from market_app.api.pagination import IdCursorPagination
+from market_app.api.parsers import FastJSONParser
+from market_app.api.renderers import FastJSONRenderer
+from market_app.api.serializers import SELLER_PREVIEW_SIZE, MarketSerializer, ProductHyperlinkedSerializer, ProductSerializer, SellerSerializer
+from market_app.db import ReadWriteRouter
+from market_app.metrics import Registry
+from market_app.middleware import RequestTimingMiddleware
+from market_app.models import Change, Market, MarketStats, Seller, Product
+
+
+def create_market(name='Markt', **kwargs):
+    data = {'location': 'Berlin', 'description': 'Beschreibung', 'net_worth': '1000.00'}
+    data.update(kwargs)
+    return Market.objects.create(name=name, **data)
+
+
+def create_sellers(count, markets):     # erstellt viele Seller auf einmal (inkl. der Verbindung zu den Markets)
+    sellers = Seller.objects.bulk_create(Seller(name=f'Seller{i}', contact_info=f'seller{i}@test.com') for i in range(count))
+    through = Seller.markets.through
+    through.objects.bulk_create(through(seller_id=seller.id, market_id=market.id) for seller in sellers for market in markets)
+    return sellers
+
+
+class APITestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()      # die ids werden in jedem Test neu vergeben, daher keine Daten aus anderen Tests verwenden!
+        throttling.store.clear()
+        self.client = APIClient()
+
+
+class SellerQueryCountTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.markets = [create_market(f'Markt{i}') for i in range(3)]
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()['results']
+
+    def test_seller_list_runs_fixed_number_of_queries(self):
+        create_sellers(10, self.markets)
+        few, _ = self.count_queries('/api/sellers/')
+        create_sellers(1000, self.markets)
+        many, data = self.count_queries('/api/sellers/')
+        self.assertEqual(few, many)
+        self.assertEqual(data[0]['market_count'], 3)
+        self.assertEqual(len(data[0]['markets']), 3)
+
+    def test_sellers_of_market_runs_fixed_number_of_queries(self):
+        url = f'/api/market/{self.markets[0].pk}/sellers/'
+        create_sellers(10, self.markets)
+        few, _ = self.count_queries(url)
+        create_sellers(1000, self.markets)
+        many, data = self.count_queries(url)
+        self.assertEqual(few, many)
+        self.assertEqual(data[0]['market_count'], 3)     # der Filter auf einen Market darf die Anzahl nicht verfälschen!
+
+    def test_market_list_shows_count_and_preview_with_fixed_number_of_queries(self):
+        create_sellers(2, self.markets)
+        few, _ = self.count_queries('/api/market/')
+        for market in [create_market(f'Neu{i}') for i in range(20)]:
+            create_sellers(8, [market])
+        many, data = self.count_queries('/api/market/')
+        self.assertEqual(few, many)
+        market = data[-1]
+        self.assertEqual(market['seller_count'], 8)
+        self.assertEqual(len(market['sellers_preview']), SELLER_PREVIEW_SIZE)
+        self.assertEqual(market['sellers_url'], f'http://testserver/api/market/{market["id"]}/sellers/')
+        self.assertNotIn('sellers', market)
+
+        few, _ = self.count_queries('/api/market/?expand=sellers&page_size=2')
+        many, data = self.count_queries('/api/market/?expand=sellers')
+        self.assertEqual(few, many)
+        self.assertEqual(len(data[-1]['sellers']), 8)
+
+    def test_update_returns_fresh_market_count(self):
+        seller = create_sellers(1, self.markets)[0]
+        response = self.client.patch(f'/api/sellers/{seller.pk}/', {'market_ids': [self.markets[0].pk]}, format='json')
+        self.assertEqual(response.json()['market_count'], 1)
+
+
+class CursorPaginationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        market = create_market()
+        seller = create_sellers(1, [market])[0]
+        Product.objects.bulk_create(
+            Product(name=f'Produkt{i}', description='', price='1.00', market=market, seller=seller) for i in range(120)
+        )
+
+    def test_pages_follow_cursor_without_gaps(self):
+        ids = []
+        url = '/api/products/?page_size=50'
+        while url:
+            data = self.client.get(url).json()
+            ids += [product['id'] for product in data['results']]
+            url = data['next']
+        self.assertEqual(ids, sorted(Product.objects.values_list('id', flat=True)))
+
+    def test_page_size_is_bounded(self):
+        self.assertEqual(len(self.client.get('/api/products/').json()['results']), 50)
+        with mock.patch.object(IdCursorPagination, 'max_page_size', 10):
+            data = self.client.get('/api/products/?page_size=100000').json()
+        self.assertEqual(len(data['results']), 10)
+
+    def test_deep_page_uses_keyset_instead_of_offset(self):
+        url = self.client.get('/api/products/?page_size=100').json()['next']
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('"id" >', sql)
+        self.assertNotIn('OFFSET', sql)
+
+
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market()
+        self.seller = create_sellers(1, [self.market])[0]
+        Product.objects.bulk_create(
+            Product(name=f'Produkt{i}', description='', price='1.50', market=self.market, seller=self.seller) for i in range(25)
+        )
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_export_streams_every_product_as_json_array(self):
+        with mock.patch('market_app.api.streaming.EXPORT_CHUNK_SIZE', 10):
+            response = self.client.get('/api/products/export/')
+            body = self.read(response)
+        self.assertTrue(response.streaming)
+        data = json.loads(body)
+        self.assertEqual(len(data), 25)
+        self.assertEqual(data[0], self.client.get(f'/api/products/{data[0]["id"]}/').json())
+
+    def test_export_with_sparse_fields_runs_one_query(self):
+        with self.assertNumQueries(1):
+            rows = json.loads(self.read(self.client.get('/api/products/export/?fields=id,name')))
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(set(rows[0]), {'id', 'name'})
+        create_sellers(10, [self.market])
+        with self.assertNumQueries(1):
+            rows = json.loads(self.read(self.client.get('/api/sellers/export/?fields=id,name')))
+        self.assertEqual([set(row) for row in rows], [{'id', 'name'}] * 11)
+        with self.assertNumQueries(2):      # Seller + prefetch der Markets
+            rows = json.loads(self.read(self.client.get('/api/sellers/export/?exclude=contact_info')))
+        self.assertEqual(rows[0]['markets'], [self.market.name])
+
+    def test_export_as_ndjson(self):
+        response = self.client.get('/api/sellers/export/?output=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self.read(response).splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['market_count'], 1)
+
+
+class ProductBulkTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market()
+        self.seller = create_sellers(1, [self.market])[0]
+
+    def rows(self, count):
+        return [
+            {'name': f'Produkt{i}', 'description': 'Beschreibung', 'price': '2.50', 'market': self.market.pk, 'seller': self.seller.pk}
+            for i in range(count)
+        ]
+
+    def test_bulk_create_uses_constant_number_of_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/products/bulk/', self.rows(10), format='json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post('/api/products/bulk/', self.rows(150), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Product.objects.count(), 160)
+        self.assertIsNotNone(response.json()[0]['id'])
+
+    def test_bulk_create_returns_errors_per_row(self):
+        rows = self.rows(3)
+        rows[1]['market'] = 9999
+        rows[2]['price'] = 'abc'
+        response = self.client.post('/api/products/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('price', errors[2])
+        self.assertFalse(Product.objects.exists())
+
+    def test_bulk_create_checks_foreign_keys_per_row(self):
+        rows = self.rows(2)
+        rows[1]['seller'] = 9999
+        errors = self.client.post('/api/products/bulk/', rows, format='json').json()
+        self.assertEqual(errors, [{}, {'seller': ['Seller nicht vorhanden!']}])
+
+    def test_bulk_update_and_delete(self):
+        ids = [product['id'] for product in self.client.post('/api/products/bulk/', self.rows(3), format='json').json()]
+        response = self.client.patch('/api/products/bulk/', [{'id': ids[0], 'price': '9.99'}, {'price': '1.00'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.json()[1])
+
+        response = self.client.patch('/api/products/bulk/', [{'id': pk, 'price': '9.99'} for pk in ids], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({str(price) for price in Product.objects.values_list('price', flat=True)}, {'9.99'})
+
+        response = self.client.delete('/api/products/bulk/', {'ids': ids[:2]}, format='json')
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), ids[2:])
+
+
+class ProductWriteTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market, self.other = create_market(), create_market('Anderer')
+        self.seller = create_sellers(1, [self.market])[0]
+        self.product = Product.objects.create(name='Apfel', description='rot', price='1.00', market=self.market, seller=self.seller)
+
+    def product_queries(self, method, url, data):      # ohne MarketStats (market_app/stats.py) und Änderungsprotokoll (market_app/changes.py)
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        side_tables = ('"market_app_marketstats"', '"market_app_change"')
+        return response, [query['sql'] for query in context.captured_queries if not any(table in query['sql'] for table in side_tables)]
+
+    def test_create_checks_market_and_seller_with_one_query(self):
+        data = {'name': 'Birne', 'description': 'grün', 'price': '2.00', 'market': self.market.pk, 'seller': self.seller.pk}
+        response, queries = self.product_queries('post', '/api/products/', data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(queries), 2)       # UNION für market/ seller + INSERT
+        self.assertEqual(response.json()['market'], self.market.pk)
+        self.assertEqual(MarketStats.objects.get(market=self.market).product_count, 2)
+
+        response, queries = self.product_queries('post', '/api/products/', {**data, 'market': 999, 'seller': 998})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'market': ['Market nicht vorhanden!'], 'seller': ['Seller nicht vorhanden!']})
+        self.assertEqual(len(queries), 1)
+
+    def test_update_writes_only_changed_columns(self):
+        url = f'/api/products/{self.product.pk}/'
+        data = {'name': 'Apfel', 'description': 'rot', 'price': '1.50', 'market': self.market.pk, 'seller': self.seller.pk}
+        response, queries = self.product_queries('put', url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)       # SELECT des Products + UPDATE (market/ seller unverändert -> nicht erneut geprüft)
+        self.assertIn('"price"', queries[1])
+        self.assertNotIn('"description"', queries[1])
+        self.assertEqual(MarketStats.objects.get(market=self.market).price_total, Decimal('1.50'))
+
+        response, queries = self.product_queries('patch', url, {'market': self.other.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(MarketStats.objects.get(market=self.other).product_count, 1)
+
+        response, queries = self.product_queries('patch', url, {'name': 'Apfel'})
+        self.assertEqual(len(queries), 1)       # nichts geändert -> kein UPDATE
+
+
+class ChangeFeedTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market()
+        self.seller = Seller.objects.create(name='Seller', contact_info='seller@test.com')
+
+    def feed(self, since=0):
+        response = self.client.get(f'/api/changes/?since={since}&output=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return [(row['op'], row['model'], row['id']) for row in rows], int(response['X-Last-Seq'])
+
+    def test_signals_and_bulk_paths_are_recorded(self):
+        rows, since = self.feed()
+        self.assertEqual(rows, [('create', 'market', self.market.pk), ('create', 'seller', self.seller.pk)])
+
+        self.seller.markets.add(self.market)
+        ids = [row['id'] for row in self.client.post('/api/products/bulk/', [
+            {'name': f'P{i}', 'description': 'd', 'price': '1.00', 'market': self.market.pk, 'seller': self.seller.pk} for i in range(3)
+        ], format='json').json()]
+        self.client.patch('/api/products/bulk/', [{'id': ids[0], 'price': '2.00'}], format='json')
+        self.client.delete('/api/products/bulk/', {'ids': ids[1:]}, format='json')
+        rows, last = self.feed(since)
+        self.assertEqual(rows, [
+            ('update', 'seller', self.seller.pk), ('update', 'market', self.market.pk),
+            *[('create', 'product', pk) for pk in ids], ('update', 'product', ids[0]), *[('delete', 'product', pk) for pk in reversed(ids[1:])],     # Django löscht in umgekehrter Reihenfolge
+        ])
+        self.assertEqual(self.feed(last), ([], last))      # nichts Neues
+
+    def test_changes_are_streamed_in_batches(self):
+        Product.objects.bulk_create(Product(name='P', description='d', price='1.00', market=self.market, seller=self.seller) for i in range(5))
+        changes.record('create', Product, Product.objects.values_list('id', flat=True))
+        with mock.patch('market_app.changes.BATCH_SIZE', 2), CaptureQueriesContext(connection) as context:
+            rows, _ = self.feed()
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(len([query for query in context.captured_queries if '"seq" > ' in query['sql']]), 4)     # 2 + 2 + 2 + 1 Zeilen
+
+    def test_compaction_keeps_latest_change_and_expires_old_entries(self):
+        for name in ['A', 'B', 'C']:
+            self.market.name = name
+            self.market.save()
+        _, since = self.feed()
+        call_command('compact_changes', stdout=io.StringIO())
+        self.assertEqual(self.feed()[0], [('create', 'seller', self.seller.pk), ('update', 'market', self.market.pk)])
+
+        call_command('compact_changes', '--max-age', '0', stdout=io.StringIO())
+        response = self.client.get(f'/api/changes/?since={since - 1}')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['last_seq'], int(response['X-Last-Seq']))
+        self.assertEqual(Change.objects.exclude(op='compact').count(), 0)
+        self.assertEqual(self.feed(since), ([], int(response['X-Last-Seq'])))      # Clients auf dem aktuellen Stand können weitermachen
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get('/api/changes/?since=-1').status_code, 400)
+
+
+class MarketStatsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market, self.other = create_market('Markt1'), create_market('Markt2')
+        self.seller = Seller.objects.create(name='Seller', contact_info='seller@test.com')
+
+    def create_product(self, price, market=None):
+        return Product.objects.create(name='Apfel', description='rot', price=Decimal(price), market=market or self.market, seller=self.seller)
+
+    def stats(self, market=None):
+        return MarketStats.objects.get(market=market or self.market)
+
+    def assertStats(self, market, product_count, price_total, seller_count=None):
+        stats = self.stats(market)
+        self.assertEqual((stats.product_count, stats.price_total), (product_count, Decimal(price_total)))
+        if seller_count is not None:
+            self.assertEqual(stats.seller_count, seller_count)
+
+    def test_products_are_counted_incrementally(self):
+        product = self.create_product('1.50')
+        self.create_product('2.25')
+        self.assertStats(self.market, 2, '3.75')
+
+        product.price = Decimal('2.00')
+        product.save()
+        self.assertStats(self.market, 2, '4.25')
+
+        product.market = self.other
+        product.save()
+        self.assertStats(self.market, 1, '2.25')
+        self.assertStats(self.other, 1, '2.00')
+
+        Product.objects.get(pk=product.pk).delete()
+        self.assertStats(self.other, 0, '0.00')
+
+    def test_sellers_are_counted(self):
+        self.seller.markets.add(self.market, self.other)
+        second = Seller.objects.create(name='Seller2', contact_info='seller2@test.com')
+        self.market.sellers.add(second)
+        self.assertStats(self.market, 0, '0', seller_count=2)
+        self.assertStats(self.other, 0, '0', seller_count=1)
+
+        self.market.sellers.remove(self.seller)
+        self.assertStats(self.market, 0, '0', seller_count=1)
+        second.delete()
+        self.assertStats(self.market, 0, '0', seller_count=0)
+        self.seller.markets.clear()
+        self.assertStats(self.other, 0, '0', seller_count=0)
+
+    def test_bulk_endpoints_update_stats(self):
+        rows = [{'name': f'Produkt{i}', 'description': 'Beschreibung', 'price': '2.50', 'market': self.market.pk, 'seller': self.seller.pk} for i in range(4)]
+        ids = [product['id'] for product in self.client.post('/api/products/bulk/', rows, format='json').json()]
+        self.assertStats(self.market, 4, '10.00')
+
+        self.client.patch('/api/products/bulk/', [{'id': ids[0], 'price': '1.00', 'market': self.other.pk}], format='json')
+        self.assertStats(self.market, 3, '7.50')
+        self.assertStats(self.other, 1, '1.00')
+
+        self.client.delete('/api/products/bulk/', {'ids': ids[1:]}, format='json')
+        self.assertStats(self.market, 0, '0.00')
+
+    def delete_queries(self, url, products, market=None):     # Abfragen für DELETE url, nachdem self.seller `products` Products in market bekommen hat
+        Product.objects.bulk_create(Product(name='Apfel', description='rot', price='1.00', market=market or self.market, seller=self.seller) for i in range(products))
+        stats.rebuild()     # bulk_create verbucht nichts
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_deleting_market_is_batched(self):
+        few = self.delete_queries(f'/api/market/{self.other.pk}/', 2, self.other)
+        many = self.delete_queries(f'/api/market/{self.market.pk}/', 200)
+        self.assertLessEqual(len(many), len(few) + 1)      # + ein DELETE mehr (SQLite: höchstens 999 Parameter pro Abfrage)
+        self.assertFalse([sql for sql in many if sql.startswith('UPDATE "market_app_marketstats"')])   # die Statistik wird ohnehin gelöscht
+        self.assertEqual(len([sql for sql in many if sql.startswith('INSERT INTO "market_app_change"')]), 1)
+        self.assertEqual(Change.objects.filter(model='product', op='delete').count(), 202)
+
+    def test_deleting_seller_is_batched(self):
+        self.create_product('2.00', self.other)
+        queries = self.delete_queries(f'/api/sellers/{self.seller.pk}/', 200)
+        self.assertLess(len(queries), 30)
+        self.assertEqual(len([sql for sql in queries if sql.startswith('UPDATE "market_app_marketstats"')]), 1)     # ein UPDATE für beide Markets
+        self.assertStats(self.market, 0, '0')
+        self.assertStats(self.other, 0, '0')
+
+    def test_rebuild_command(self):
+        self.create_product('1.00')
+        MarketStats.objects.update(product_count=99, price_total=0)
+        self.other.stats.delete()
+        call_command('rebuild_market_stats', stdout=io.StringIO())
+        self.assertStats(self.market, 1, '1.00')
+        self.assertStats(self.other, 0, '0.00')
+
+    def test_endpoints(self):
+        self.create_product('1.00')
+        self.create_product('2.00')
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/market/{self.market.pk}/stats/')
+        self.assertEqual(response.json()['product_count'], 2)
+        self.assertEqual(response.json()['total_price'], '3.00')
+        self.assertEqual(response.json()['average_price'], '1.50')
+        self.assertEqual(self.client.get('/api/market/9999/stats/').status_code, 404)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/market/stats/')
+        self.assertEqual([row['market'] for row in response.json()['results']], [self.market.pk, self.other.pk])
+        self.assertIsNone(response.json()['results'][1]['average_price'])
+
+
+class SellerMembershipTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.markets = [create_market(f'Markt{i}') for i in range(3)]
+
+    def memberships(self):
+        return set(Seller.markets.through.objects.values_list('seller_id', 'market_id'))
+
+    def test_replaces_memberships_with_set_difference(self):
+        sellers = create_sellers(2, self.markets[:2])
+        stats.rebuild()     # create_sellers schreibt direkt in die Zwischentabelle (ohne Signals)
+        first, second = sellers[0].pk, sellers[1].pk
+        m0, m1, m2 = (market.pk for market in self.markets)
+        response = self.client.put('/api/sellers/markets/', {first: [m1, m2], second: [m0, m1]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'added': 1, 'removed': 1, 'sellers': 1})
+        self.assertEqual(self.memberships(), {(first, m1), (first, m2), (second, m0), (second, m1)})
+        self.assertEqual([MarketStats.objects.get(market_id=pk).seller_count for pk in (m0, m1, m2)], [1, 2, 1])
+
+    def test_constant_queries_and_one_notification(self):
+        small, large = create_sellers(2, self.markets[:1]), create_sellers(40, self.markets[:1])
+        handler = mock.Mock()
+        signals.memberships_changed.connect(handler)
+        self.addCleanup(signals.memberships_changed.disconnect, handler)
+        with CaptureQueriesContext(connection) as few:
+            self.client.put('/api/sellers/markets/', {seller.pk: [self.markets[1].pk] for seller in small}, format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.put('/api/sellers/markets/', {seller.pk: [self.markets[1].pk] for seller in large}, format='json')
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(handler.call_count, 2)
+        self.assertEqual(handler.call_args.kwargs['market_ids'], {self.markets[0].pk, self.markets[1].pk})
+
+    def test_errors_per_seller(self):
+        seller = create_sellers(1, [])[0]
+        response = self.client.put('/api/sellers/markets/', {seller.pk: [9999], '9999': [], 'x': [1], str(seller.pk + 1): 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {str(seller.pk), '9999', 'x', str(seller.pk + 1)})
+        self.assertEqual(self.memberships(), set())
+
+
+class ImportCatalogueTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with catalogue.open_text(path, 'wt') as file:
+            file.write(text)
+        return path
+
+    def test_import_markets_sellers_and_products(self):
+        markets = self.write('markets.csv.gz', 'name,location,description,net_worth\nMarkt1,Berlin,A,100.00\nMarkt2,Wien,B,5.50\n')
+        call_command('import_catalogue', 'market', markets, stdout=io.StringIO())
+        sellers = self.write('sellers.ndjson', '{"name": "Seller1", "contact_info": "a@test.com", "markets": ["Markt1", "Markt2"]}\n\n')
+        call_command('import_catalogue', 'seller', sellers, '--lookup', 'name', stdout=io.StringIO())
+        products = self.write('products.csv', 'name,description,price,market,seller\n' + ''.join(f'P{i},rot,1.50,Markt1,Seller1\n' for i in range(5)))
+        out = io.StringIO()
+        call_command('import_catalogue', 'product', products, '--lookup', 'name', '--batch-size', '2', stdout=out)
+
+        self.assertIn('5 Zeilen importiert', out.getvalue())
+        self.assertEqual(Product.objects.filter(market__name='Markt1', seller__name='Seller1').count(), 5)
+        market = Market.objects.get(name='Markt1')
+        self.assertEqual((market.stats.product_count, market.stats.price_total, market.stats.seller_count), (5, Decimal('7.50'), 1))
+        self.assertFalse(os.path.exists(f'{products}.checkpoint'))
+
+    def test_resume_from_checkpoint(self):
+        market = create_market()
+        seller = create_sellers(1, [market])[0]
+        lines = [json.dumps({'name': f'P{i}', 'description': 'rot', 'price': '1.00', 'market': market.pk, 'seller': seller.pk}) for i in range(5)]
+        lines[3] = json.dumps({'name': 'P3', 'description': 'rot', 'price': 'abc', 'market': market.pk, 'seller': seller.pk})
+        path = self.write('products.ndjson', '\n'.join(lines))
+        with self.assertRaisesMessage(CommandError, 'Zeile 4: price'):
+            call_command('import_catalogue', 'product', path, '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 2)      # der erste Batch ist gespeichert, der zweite nicht
+
+        lines[3] = json.dumps({'name': 'P3', 'description': 'rot', 'price': '1.00', 'market': market.pk, 'seller': seller.pk})
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines))
+        call_command('import_catalogue', 'product', path, '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(list(Product.objects.order_by('id').values_list('name', flat=True)), [f'P{i}' for i in range(5)])
+
+    def test_rows_with_id_update_existing_objects(self):
+        market = create_market('Alt')
+        path = self.write('markets.csv', f'id,name,location,description,net_worth\n{market.pk},Neu,Berlin,A,1.00\n')
+        call_command('import_catalogue', 'market', path, stdout=io.StringIO())
+        self.assertEqual(list(Market.objects.values_list('name', flat=True)), ['Neu'])
+
+
+class ExportCatalogueTests(APITestCase):
+
+    def test_export_shards_and_manifest(self):
+        markets = [create_market(f'Markt{i}') for i in range(2)]
+        seller = create_sellers(1, markets)[0]
+        Product.objects.bulk_create(Product(name=f'P{i}', description='rot', price='1.50', market=markets[i % 2], seller=seller) for i in range(5))
+        Product.objects.filter(id=Product.objects.order_by('id')[2].id).delete()     # Lücke in den ids
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('export_catalogue', directory, '--workers', '0', '--shard-size', '2', stdout=io.StringIO())
+            with open(os.path.join(directory, 'manifest.json')) as file:
+                manifest = json.load(file)
+            self.assertEqual({name: entry['rows'] for name, entry in manifest['models'].items()}, {'market': 2, 'seller': 1, 'product': 4})
+            self.assertEqual(len(manifest['models']['product']['shards']), 3)
+
+            rows = []
+            for shard in manifest['models']['product']['shards']:
+                with catalogue.open_text(os.path.join(directory, shard['file'])) as file:
+                    rows.extend(catalogue.read_rows(file, 'ndjson'))
+            self.assertEqual([row['id'] for row in rows], list(Product.objects.order_by('id').values_list('id', flat=True)))
+            self.assertEqual(rows[0]['price'], '1.50')
+            with catalogue.open_text(os.path.join(directory, manifest['models']['seller']['shards'][0]['file'])) as file:
+                self.assertEqual(next(catalogue.read_rows(file, 'ndjson'))['markets'], [market.pk for market in markets])
+
+            call_command('export_catalogue', directory, '--workers', '0', '--format', 'csv', '--models', 'product', stdout=io.StringIO())
+            Product.objects.update(price='9.99')
+            for name in os.listdir(directory):      # die CSV-Dateien lassen sich wieder importieren (Zeilen mit id werden überschrieben)
+                if name.endswith('.csv.gz'):
+                    call_command('import_catalogue', 'product', os.path.join(directory, name), stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertEqual({str(price) for price in Product.objects.values_list('price', flat=True)}, {'1.50'})
+
+
+class RequestTimingTests(APITestCase):
+
+    def test_server_timing_header(self):
+        create_sellers(3, [create_market()])
+        with self.assertLogs('market_app.timing', 'INFO') as logs:
+            response = self.client.get('/api/sellers/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=[\d.]+, render;dur=[\d.]+, total;dur=[\d.]+$')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['path'], line['view'], line['status']), ('/api/sellers/', 'SellerViewSet', 200))
+        self.assertNotIn('duplicates', line)
+
+    def test_duplicate_statements_are_flagged(self):
+        sellers = create_sellers(3, [create_market()])
+        middleware = RequestTimingMiddleware(lambda request: HttpResponse(str([SellerSerializer(seller).data['market_count'] for seller in sellers])))
+        with self.assertLogs('market_app.timing', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertIn('dup;desc="2 repeated statements"', response['Server-Timing'])
+        duplicates = json.loads(logs.records[0].getMessage())['duplicates']     # ohne annotate/prefetch: markets und get_market_count je eine Abfrage pro Seller
+        self.assertEqual([row['count'] for row in duplicates], [3, 3])
+
+    def test_connection_pragmas_are_not_counted(self):
+        def view(request):
+            with connection.cursor() as cursor:
+                for name in ['foreign_keys', 'foreign_keys', 'synchronous', 'synchronous']:     # wie market_app/db.py bei jeder neuen Verbindung
+                    cursor.execute(f'PRAGMA {name}')
+            return HttpResponse(str(Market.objects.count()))
+        with self.assertLogs('market_app.timing', 'INFO') as logs:
+            response = RequestTimingMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+
+    async def test_async_views_are_not_adapted(self):      # beide Middlewares laufen unter ASGI direkt async und zählen trotzdem die Abfragen des async ORM
+        with self.assertLogs('django.request', 'DEBUG') as logs, override_settings(DEBUG=True):     # Django meldet "... adapted for middleware" nur mit DEBUG
+            response = await AsyncClient().get('/api/async/products/')
+            logging.getLogger('django.request').debug('Ende')
+        self.assertEqual([record.getMessage() for record in logs.records], ['Ende'])
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_sampling(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/sellers/'))
+
+
+class MetricsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry()
+        for target in ('market_app.middleware.registry', 'market_app.views.registry'):
+            patcher = mock.patch(target, self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_histograms_per_route(self):
+        market = create_market()
+        self.client.get('/api/products/')
+        self.client.get('/api/products/')
+        self.client.get(f'/api/market/{market.pk}/sellers/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE api_request_duration_seconds histogram', text)
+        self.assertIn('api_request_duration_seconds_count{route="product-list",method="GET"} 2', text)
+        self.assertIn('api_request_queries_bucket{route="product-list",method="GET",le="+Inf"} 2', text)
+        self.assertIn('api_response_bytes_count{route="market-sellers",method="GET"} 1', text)
+
+    async def test_asgi_requests_do_not_add_stores(self):
+        client = AsyncClient()
+        for _ in range(20):
+            await client.get('/api/products/')      # sync View unter ASGI
+            await client.get('/api/async/products/')
+        self.assertLessEqual(len(self.registry.stores), 2)
+        text = self.registry.render()
+        self.assertIn('api_request_duration_seconds_count{route="api/async/products/",method="GET"} 20', text)
+        self.assertIn('api_request_duration_seconds_count{route="product-list",method="GET"} 20', text)
+
+    def test_threads_and_processes(self):
+        labels = (('route', 'test'), ('method', 'GET'))
+        threads = [threading.Thread(target=lambda: [self.registry.observe('api_request_queries', labels, 3) for i in range(1000)]) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.registry.snapshot()[('api_request_queries', labels)][-1], 24000)
+        self.assertEqual(len(self.registry.stores), 0)     # beendete Threads werden zusammengefasst (z.B. ein Thread pro Request unter ASGI)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = Registry()      # ein anderer Worker-Prozess
+            other.observe('api_request_queries', labels, 1)
+            with mock.patch('os.getpid', return_value=999999):
+                other.flush()
+            self.assertIn('api_request_queries_count{route="test",method="GET"} 8001', self.registry.render())
+
+
+class BenchmarkTests(APITestCase):
+
+    def test_generator_and_scenarios(self):
+        sizes = {'markets': 3, 'sellers': 5, 'products': 40}
+        generator.generate(seed=7, **sizes)
+        self.assertEqual([Market.objects.count(), Seller.objects.count(), Product.objects.count()], [3, 5, 40])
+        self.assertEqual(sum(MarketStats.objects.values_list('product_count', flat=True)), 40)
+        for name in scenarios.SCENARIOS:
+            result = scenarios.run(name, sizes, requests=3, warmup=1, memory_requests=1)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreater(result['queries_mean'], 0, name)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'products': '1/min'}})
+    def test_runs_are_repeatable(self):      # ohne Drosselung und ohne die angelegten Products früherer Läufe
+        sizes = {'markets': 2, 'sellers': 3, 'products': 10}
+        generator.generate(seed=7, **sizes)
+        before = [Product.objects.count(), Change.objects.count(), list(MarketStats.objects.order_by('id').values_list('product_count', 'price_total'))]
+        for i in range(2):
+            self.assertEqual(scenarios.run('create', sizes, requests=5, warmup=1, memory_requests=1)['errors'], 0)
+            self.assertEqual(scenarios.run('list', sizes, requests=5, warmup=1, memory_requests=1)['errors'], 0)
+        self.assertEqual([Product.objects.count(), Change.objects.count(), list(MarketStats.objects.order_by('id').values_list('product_count', 'price_total'))], before)
+
+    def test_compare(self):
+        baseline = {'scenarios': {'list': {'p50_ms': 10, 'p95_ms': 20, 'queries_mean': 2, 'peak_memory_kb': 100}}}
+        current = {'scenarios': {'list': {'p50_ms': 11, 'p95_ms': 30, 'queries_mean': 2, 'peak_memory_kb': 100}, 'detail': {}}}
+        self.assertEqual(scenarios.compare(baseline, current, 0.25), ['list.p95_ms: 20.00 -> 30.00 (+50%)'])
+        self.assertEqual(scenarios.compare(baseline, current, 0.5), [])
+
+
+class ThrottleTests(APITestCase):
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'products': '120/min'}})
+    def test_requests_are_charged_by_rows_returned(self):
+        market = create_market()
+        seller = create_sellers(1, [market])[0]
+        Product.objects.bulk_create(Product(name=f'P{i}', description='rot', price='1.00', market=market, seller=seller) for i in range(60))
+        with mock.patch('rest_framework.throttling.SimpleRateThrottle.timer', return_value=600.0):
+            self.assertEqual(self.client.get('/api/products/?page_size=60').status_code, 200)      # kostet 60
+            self.assertEqual(self.client.get('/api/products/?page_size=59').status_code, 200)      # 119
+            self.assertEqual(self.client.get(f'/api/products/{Product.objects.first().pk}/').status_code, 200)     # 120
+            response = self.client.get('/api/products/?page_size=1')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '60')
+            self.assertEqual(self.client.get('/api/products/?page_size=1').status_code, 429)
+            self.assertEqual(throttling.store.get('throttle:products:127.0.0.1', 10), 120)     # 429 wird nicht berechnet
+            self.assertEqual(self.client.get('/api/sellers/').status_code, 200)      # ohne Rate für "sellers" keine Drosselung
+        with mock.patch('rest_framework.throttling.SimpleRateThrottle.timer', return_value=660.0):     # nächstes Zeitfenster
+            self.assertEqual(self.client.get('/api/products/?page_size=1').status_code, 200)
+
+    def test_concurrent_charges_are_not_lost(self):     # wie mehrere Worker: jeder Thread hat seine eigene Verbindung
+        def charge():
+            for i in range(50):
+                throttling.store.add('throttle:products:1', 10, 1)
+        threads = [threading.Thread(target=charge) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(throttling.store.get('throttle:products:1', 10), 400)
+        throttling.store.add('throttle:products:1', 11, 5)     # neues Zeitfenster beginnt bei 0
+        throttling.store.add('throttle:products:1', 10, 7)     # späte Buchung für das alte Zeitfenster
+        self.assertEqual(throttling.store.get('throttle:products:1', 11), 5)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'products': '100/min'}})
+    def test_export_is_charged_by_rows_streamed(self):
+        market = create_market()
+        seller = create_sellers(1, [market])[0]
+        Product.objects.bulk_create(Product(name=f'P{i}', description='rot', price='1.00', market=market, seller=seller) for i in range(60))
+        with mock.patch('rest_framework.throttling.SimpleRateThrottle.timer', return_value=600.0):
+            response = self.client.get('/api/products/export/')
+            self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 60)       # kostet 60
+            self.assertEqual(self.client.get('/api/products/?page_size=40').status_code, 200)   # 100
+            self.assertEqual(self.client.get('/api/products/export/').status_code, 429)
+
+
+class DetailCacheTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market()
+        self.seller = create_sellers(1, [self.market])[0]
+        self.product = Product.objects.create(name='Apfel', description='rot', price='0.50', market=self.market, seller=self.seller)
+
+    def get(self, url, queries):       # bei jedem Request kommt eine Abfrage für den ETag (updated_at) dazu
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_second_request_is_served_from_cache(self):
+        url = f'/api/products/{self.product.pk}/'
+        self.get(url, 2)
+        self.assertEqual(self.get(url, 1)['name'], 'Apfel')
+
+    def test_save_invalidates_entry(self):
+        url = f'/api/products/{self.product.pk}/'
+        self.get(url, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'price': '0.75'}, format='json')
+        self.assertEqual(self.get(url, 2)['price'], '0.75')
+
+    def test_change_from_other_process_is_not_served_from_cache(self):     # queryset.update() invalidiert nichts, wie ein anderer Worker mit eigenem LocMem
+        url = f'/api/products/{self.product.pk}/'
+        self.get(url, 2)
+        Product.objects.filter(pk=self.product.pk).update(price='0.75', updated_at=timezone.now())
+        self.assertEqual(self.get(url, 2)['price'], '0.75')
+
+    def test_membership_change_invalidates_market_and_seller(self):
+        market_url = f'/api/market/{self.market.pk}/'
+        seller_url = f'/api/sellers/{self.seller.pk}/'
+        self.assertEqual(self.client.get(market_url).json()['seller_count'], 1)
+        self.client.get(seller_url)
+        other = create_sellers(1, [])[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            other.markets.add(self.market)
+            self.seller.markets.clear()
+        self.assertEqual(self.get(market_url, 3)['sellers_preview'], [f'http://testserver/api/sellers/{other.pk}/'])
+        self.assertEqual(self.get(seller_url, 3)['market_count'], 0)
+
+    def test_market_rename_invalidates_sellers(self):
+        seller_url = f'/api/sellers/{self.seller.pk}/'
+        self.client.get(seller_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.market.name = 'Neuer Markt'
+            self.market.save()
+        self.assertEqual(self.get(seller_url, 3)['markets'], ['Neuer Markt'])
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+            with self.settings(CACHES=backend):
+                url = f'/api/market/{self.market.pk}/'
+                first = self.get(url, 3)
+                self.assertEqual(self.get(url, 1), first)
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market()
+        self.seller = create_sellers(1, [self.market])[0]
+        self.product = Product.objects.create(name='Apfel', description='rot', price='0.50', market=self.market, seller=self.seller)
+
+    def test_detail_answers_304_for_matching_etag(self):
+        url = f'/api/products/{self.product.pk}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_detail_etag_changes_after_update(self):
+        url = f'/api/products/{self.product.pk}/'
+        etag = self.client.get(url)['ETag']
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_answers_304_with_a_single_query(self):
+        response = self.client.get('/api/products/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('"market_app_change"', context.captured_queries[0]['sql'])      # nicht die Products (konstante Kosten)
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_changes_after_delete(self):
+        Product.objects.create(name='Birne', description='gelb', price='0.80', market=self.market, seller=self.seller)
+        etag = self.client.get('/api/products/')['ETag']
+        self.product.delete()
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_changes_after_update(self):
+        etag = self.client.get('/api/products/')['ETag']
+        self.product.price = Decimal('0.60')
+        self.product.save()
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_market_update_without_rename_does_not_touch_sellers(self):
+        url = f'/api/sellers/{self.seller.pk}/'
+        response = self.client.get(url)
+        updated_at = Seller.objects.get(pk=self.seller.pk).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.patch(f'/api/market/{self.market.pk}/', {'net_worth': '2000.00'}, format='json').status_code, 200)
+        self.assertEqual(Seller.objects.get(pk=self.seller.pk).updated_at, updated_at)
+        self.assertFalse(Change.objects.filter(model='seller', object_id=self.seller.pk, op='update').exists())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.client.patch(f'/api/market/{self.market.pk}/', {'name': 'Neuer Markt'}, format='json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_membership_change_touches_market(self):
+        url = f'/api/market/{self.market.pk}/'
+        Market.objects.filter(pk=self.market.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        etag = self.client.get(url)['ETag']
+        self.seller.markets.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ProductFilterTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.markets = [create_market(f'Markt{i}') for i in range(2)]
+        self.seller = create_sellers(1, self.markets)[0]
+        Product.objects.bulk_create(
+            Product(name=name, description='', price=price, market=market, seller=self.seller)
+            for market in self.markets
+            for name, price in [('Apfel', '0.50'), ('Apfelsaft', '1.99'), ('Birne', '0.80'), ('Zitrone', '0.30')]
+        )
+
+    def names(self, query):
+        return [product['name'] for product in self.client.get(f'/api/products/?{query}').json()['results']]
+
+    def query_plan(self, query):        # EXPLAIN QUERY PLAN der Abfrage, die die Seite lädt
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'/api/products/?{query}')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + ctx.captured_queries[-1]['sql'])
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_filters_and_ordering(self):
+        market = self.markets[0].pk
+        self.assertEqual(self.names(f'market={market}&min_price=0.50&max_price=1.00'), ['Apfel', 'Birne'])
+        self.assertEqual(self.names(f'market={market}&ordering=-price'), ['Apfelsaft', 'Birne', 'Apfel', 'Zitrone'])
+        self.assertEqual(self.names(f'seller={self.seller.pk}&name_prefix=Apfel&ordering=name'), ['Apfel', 'Apfel', 'Apfelsaft', 'Apfelsaft'])
+
+    def test_invalid_filter_value(self):
+        response = self.client.get('/api/products/?min_price=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('min_price', response.json())
+
+    def test_common_filters_use_an_index(self):
+        market = self.markets[0].pk
+        for query, index in [
+            (f'market={market}&min_price=0.50&max_price=1.00', 'product_market_price_idx'),
+            (f'seller={self.seller.pk}&ordering=price', 'product_seller_price_idx'),
+            ('name_prefix=Apf', 'product_name_idx'),
+            ('ordering=price', 'product_price_idx'),
+        ]:
+            plan = self.query_plan(query)
+            self.assertIn(index, plan, query)
+            self.assertNotRegex(plan, r'SCAN market_app_product(?! USING)', query)
+
+    def test_ordering_with_ties_pages_by_keyset(self):      # viele gleiche Preise: Reihenfolge nach id, Cursor ohne OFFSET
+        Product.objects.bulk_create(
+            Product(name='Gleich', description='', price='1.00', market=self.markets[0], seller=self.seller) for i in range(130)
+        )
+        for ordering, expected in [('price', sorted(Product.objects.values_list('price', 'id'))), ('-name', sorted(Product.objects.values_list('name', 'id'), reverse=True))]:
+            field = ordering.lstrip('-')
+            rows, pages = [], []
+            url = f'/api/products/?ordering={ordering}&page_size=50'
+            while url:
+                with CaptureQueriesContext(connection) as ctx:
+                    data = self.client.get(url).json()
+                self.assertFalse([query['sql'] for query in ctx.captured_queries if 'OFFSET' in query['sql']], ordering)
+                rows += [(Decimal(row[field]) if field == 'price' else row[field], row['id']) for row in data['results']]
+                pages.append(url)
+                url = data['next']
+            self.assertEqual(rows, expected)
+            previous = self.client.get(pages[-1]).json()['previous']     # zurückblättern liefert wieder genau die vorletzte Seite
+            self.assertEqual(self.client.get(previous).json()['results'], self.client.get(pages[-2]).json()['results'])
+
+        plan = self.query_plan(self.client.get('/api/products/?ordering=price&page_size=50').json()['next'].split('?', 1)[1])
+        self.assertIn('product_price_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)       # (price, id) kommt sortiert aus dem Index
+
+
+class SearchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market('Wochenmarkt', location='Hamburg', description='Obst und Gemüse')
+        seller = create_sellers(1, [self.market])[0]
+        self.apple = Product.objects.create(name='Apfel', description='rot und süß', price='0.50', market=self.market, seller=seller)
+        Product.objects.create(name='Apfelsaft', description='naturtrüb', price='1.99', market=self.market, seller=seller)
+        Product.objects.create(name='Birne', description='gelb', price='0.80', market=self.market, seller=seller)
+
+    def results(self, query):
+        response = self.client.get(f'/api/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_finds_products_and_markets(self):
+        self.assertEqual({hit['name'] for hit in self.results('q=apf')}, {'Apfel', 'Apfelsaft'})
+        self.assertEqual([hit['type'] for hit in self.results('q=gemuse')], ['market'])
+        self.assertEqual(self.results('q=hamburg&type=product'), [])
+        self.assertEqual(self.results('q=süß')[0]['url'], f'http://testserver/api/products/{self.apple.pk}/')
+
+    def test_short_words_are_not_prefixes(self):
+        self.assertEqual(search.fts_query('a Apf'), '"a" "Apf"*')
+        self.assertEqual({hit['name'] for hit in self.results('q=ap')}, {'Apfel', 'Apfelsaft'})
+        self.assertEqual(self.results('q=a'), [])       # kein Wort "a"
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'market_app_product_fts'")
+            self.assertIn("prefix='2 3'", cursor.fetchone()[0])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.apple.name = 'Quitte'
+        self.apple.save()
+        self.assertEqual([hit['name'] for hit in self.results('q=quitte')], ['Quitte'])
+        Product.objects.filter(name='Apfelsaft').delete()
+        self.assertEqual(self.results('q=apf'), [])
+
+    def test_pagination(self):
+        data = self.client.get('/api/search/?q=apf&page_size=1').json()
+        self.assertEqual(len(data['results']), 1)
+        second = self.client.get(data['next']).json()
+        self.assertIsNone(second['next'])
+        self.assertNotEqual(second['results'][0]['id'], data['results'][0]['id'])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.results('q="*'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO market_app_product_fts(market_app_product_fts) VALUES ('delete-all')")
+        self.assertEqual(self.results('q=birne'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual([hit['name'] for hit in self.results('q=birne')], ['Birne'])
+
+
+class DatabaseSetupTests(APITestCase):
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -65536)
+
+    def test_reads_use_read_alias_outside_of_transactions(self):
+        router = ReadWriteRouter()
+        self.assertEqual(router.db_for_read(Product), 'default')     # TestCase läuft immer in einer Transaktion
+        with mock.patch.object(connections['default'], 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(Product), 'read')
+        self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertFalse(router.allow_migrate('read', 'market_app'))
+
+
+class AsyncViewTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market()
+        self.seller = create_sellers(1, [self.market])[0]
+        Product.objects.bulk_create(
+            Product(name=f'Produkt{i}', description='', price='1.50', market=self.market, seller=self.seller) for i in range(5)
+        )
+
+    async def test_list_pages_match_sync_serializers(self):
+        client = AsyncClient()
+        response = await client.get('/api/async/products/?page_size=3&count=1')
+        data = response.json()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(len(data['results']), 3)
+        second = (await client.get(data['next'])).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        sync = await sync_to_async(self.client.get)('/api/products/?page_size=3')
+        self.assertEqual(data['results'], sync.json()['results'])
+
+    async def test_detail_views(self):
+        client = AsyncClient()
+        seller = (await client.get(f'/api/async/sellers/{self.seller.pk}/')).json()
+        self.assertEqual(seller['market_count'], 1)
+        market = (await client.get(f'/api/async/market/{self.market.pk}/')).json()
+        self.assertEqual((market['seller_count'], market['sellers_preview']), (1, [f'http://testserver/api/sellers/{self.seller.pk}/']))
+        market = (await client.get(f'/api/async/market/{self.market.pk}/?expand=sellers')).json()
+        self.assertEqual(market['sellers'], [f'http://testserver/api/sellers/{self.seller.pk}/'])
+        self.assertEqual((await client.get('/api/async/products/9999/')).status_code, 404)
+        self.assertEqual((await client.get('/api/async/products/?after=x')).status_code, 400)
+
+
+@override_settings(CHANGE_EVENTS_POLL_INTERVAL=0.01)
+class ChangeEventTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market, self.other = create_market(), create_market('Anderer')
+        self.seller = create_sellers(1, [self.market, self.other])[0]
+        self.product = Product.objects.create(name='Apfel', description='rot', price='1.00', market=self.market, seller=self.seller)
+
+    async def next_event(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(anext(stream), 2)
+            if chunk.startswith(b'id:'):
+                lines = chunk.decode().splitlines()
+                return int(lines[0][4:]), lines[1][7:], json.loads(lines[2][6:])
+
+    async def test_price_changes_are_pushed_per_market(self):
+        response = await AsyncClient().get(f'/api/events/?market={self.market.pk}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertEqual(len(events.hub.subscribers), 1)
+
+        await Product.objects.acreate(name='Birne', description='', price='3.00', market=self.other, seller=self.seller)     # anderer Market
+        self.product.price = Decimal('2.50')
+        await self.product.asave()
+        seq, name, data = await self.next_event(stream)
+        self.assertEqual((name, data), ('product', {'op': 'update', 'id': self.product.pk, 'market': self.market.pk, 'price': '2.50'}))
+
+        self.market.name = 'Neu'
+        await self.market.asave()
+        _, name, data = await self.next_event(stream)
+        self.assertEqual((name, data['id'], data['name']), ('market', self.market.pk, 'Neu'))
+
+        response.close()        # wie am Ende eines ASGI-Requests (auch wenn der Client die Verbindung trennt)
+        self.assertEqual(len(events.hub.subscribers), 0)
+
+        response = await AsyncClient().get(f'/api/events/?market={self.market.pk}', headers={'Last-Event-ID': str(seq - 1)})     # verpasste Änderungen
+        stream = aiter(response.streaming_content)
+        self.assertEqual((await self.next_event(stream))[:2], (seq, 'product'))
+        await stream.aclose()
+
+    async def test_fan_out_reads_change_log_once(self):
+        streams = []
+        for _ in range(20):
+            response = await AsyncClient().get('/api/events/')
+            streams.append(aiter(response.streaming_content))
+            await anext(streams[-1])
+        self.product.price = Decimal('4.00')
+        await self.product.asave()
+        with mock.patch('market_app.api.events.load_events', wraps=events.load_events) as load:
+            for stream in streams:
+                self.assertEqual((await self.next_event(stream))[2]['price'], '4.00')
+        self.assertEqual(load.call_count, 1)
+        for stream in streams:
+            await stream.aclose()
+
+    async def test_hub_does_not_inherit_request_context(self):     # die Abfragen des Hubs gehören nicht zu dem Request, der ihn gestartet hat
+        queries = []
+        def recorder(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        with middleware.recording(recorder):
+            stream = events.EventStream(None, None)
+            await anext(stream)
+        self.product.price = Decimal('5.00')
+        await self.product.asave()
+        queries.clear()
+        self.assertEqual((await self.next_event(stream))[2]['price'], '5.00')
+        self.assertEqual(queries, [])
+        await stream.iterator.aclose()
+
+    def test_requires_asgi_and_valid_parameters(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
+        self.assertEqual(async_to_sync(AsyncClient().get)('/api/events/?market=x').status_code, 400)
+
+
+class SparseFieldsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.market = create_market()
+        self.seller = create_sellers(1, [self.market])[0]
+        self.product = Product.objects.create(name='Apfel', description='rot', price='0.50', market=self.market, seller=self.seller)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), ' '.join(query['sql'] for query in ctx.captured_queries)
+
+    def test_fields_trim_payload_and_columns(self):
+        data, sql = self.get('/api/products/?fields=id,name')
+        self.assertEqual(data['results'], [{'id': self.product.pk, 'name': 'Apfel'}])
+        self.assertNotIn('"description"', sql)
+
+    def test_exclude(self):
+        data, sql = self.get(f'/api/products/{self.product.pk}/?exclude=description,seller')
+        self.assertEqual(set(data), {'id', 'name', 'price', 'market'})
+        self.assertNotIn('"description"', sql)
+
+    def test_unrequested_relations_are_not_loaded(self):
+        data, sql = self.get('/api/sellers/?fields=id,name')
+        self.assertEqual(data['results'], [{'id': self.seller.pk, 'name': self.seller.name}])
+        self.assertNotIn('market_count', sql)
+        self.assertNotIn('market_app_market', sql)
+        data, sql = self.get(f'/api/market/{self.market.pk}/sellers/?fields=id,market_count')
+        self.assertEqual(data['results'], [{'id': self.seller.pk, 'market_count': 1}])
+        data, sql = self.get('/api/market/?exclude=seller_count,sellers_preview')
+        self.assertNotIn('market_app_seller', sql)
+        self.assertNotIn('sellers', data['results'][0])
+
+    def test_fields_are_ignored_for_writes(self):
+        response = self.client.patch(f'/api/products/{self.product.pk}/?fields=id', {'price': '0.60'}, format='json')
+        self.assertEqual(response.json()['price'], '0.60')
+
+
+class FastSerializerTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        market = create_market()
+        seller = create_sellers(1, [market])[0]
+        Product.objects.bulk_create(
+            Product(name=f'Prödukt "{i}"', description='Zeile\nzwei', price=price, market=market, seller=seller)
+            for i, price in enumerate(['0.50', '10', '1234567.89', '0.01', '99.999'])
+        )
+
+    def test_output_is_identical_to_drf_serializers(self):
+        request = RequestFactory().get('/api/products/')
+        products = Product.objects.order_by('id')
+        rows = products.values(*FastProductSerializer().columns)
+        render = JSONRenderer().render
+        self.assertEqual(render(FastProductSerializer().to_representation(rows)), render(ProductSerializer(products, many=True).data))
+        self.assertEqual(
+            render(FastProductHyperlinkedSerializer(request).to_representation(rows)),
+            render(ProductHyperlinkedSerializer(products, many=True, context={'request': request}).data),
+        )
+
+    def test_list_uses_values_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/products/?ordering=-price&fields=id,price').json()
+        self.assertEqual([product['price'] for product in data['results']], ['1234567.89', '100.00', '10.00', '0.50', '0.01'])
+        self.assertNotIn('"name"', ctx.captured_queries[-1]['sql'])
+
+
+class FastJSONTests(APITestCase):
+
+    def payload(self):
+        market = create_market('Markt ü \u2028')
+        return {
+            'market': MarketSerializer(market, context={'request': RequestFactory().get('/')}).data,
+            'decimal': Decimal('12.30'),
+            'datetime': datetime(2024, 11, 21, 6, 53, 12, 123456, tzinfo=dt_timezone.utc),
+            'date': date(2024, 11, 21),
+            'nested': [{'a': 1.5, 'b': None, 'c': True}, 'x'],
+            1: 'int key',
+        }
+
+    def test_renderer_output_matches_drf(self):
+        data = self.payload()
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        with mock.patch('market_app.api.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser(self):
+        body = '{"name": "Äpfel", "price": 1.5, "ids": [1, 2]}'.encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), {'name': 'Äpfel', 'price': 1.5, 'ids': [1, 2]})
+        for invalid in [b'{"a": NaN}', b'{"a": ']:
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(invalid))
+
+    def test_api_uses_fast_renderer_and_parser(self):
+        market = create_market()
+        seller = create_sellers(1, [market])[0]
+        response = self.client.post('/api/products/', {'name': 'Apfel', 'description': 'rot', 'price': '0.50', 'market': market.pk, 'seller': seller.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
@@ -1,3 +1,10 @@
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from market_app.metrics import registry
+
 # Create your views here.
+
+
+def metrics_view(request):      # /metrics für Prometheus (alle Worker-Prozesse, wenn settings.METRICS_DIR gesetzt ist)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
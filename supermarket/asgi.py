@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+The async endpoints under /api/async/ (market_app/api/async_views.py) only
+free the worker while waiting on the database when served through this
+application, e.g. ``uvicorn supermarket.asgi:application``. The same holds
+for the Server-Sent Events stream at /api/events/ (market_app/api/events.py),
+which is only served under ASGI.
 """
 
 import os
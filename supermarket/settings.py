@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'market_app.middleware.MetricsMiddleware',             # Histogramme pro Route für /metrics
+    'market_app.middleware.RequestTimingMiddleware',       # als erstes, damit die Gesamtzeit alle anderen Middlewares enthält
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,13 +80,107 @@ WSGI_APPLICATION = 'supermarket.wsgi.application'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 DATABASES = {
-    'default': {
+    'default': {                # für alle Schreibzugriffe
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,            # Verbindung wird wiederverwendet statt bei jedem Request neu geöffnet
+        'CONN_HEALTH_CHECKS': True,     # kaputte Verbindungen werden vor der Wiederverwendung erkannt
+        'OPTIONS': {
+            'timeout': 20,                      # Sekunden warten, falls die Datenbank gerade gesperrt ist
+            'transaction_mode': 'IMMEDIATE',    # Schreib-Transaktionen sperren sofort (verhindert "database is locked" beim Upgrade von Lese- zu Schreibsperre)
+        },
+    },
+    'read': {                   # für Lesezugriffe außerhalb von Transaktionen (siehe market_app.db.ReadWriteRouter)
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': 'PRAGMA query_only = ON',   # über diese Verbindung kann nicht geschrieben werden
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['market_app.db.ReadWriteRouter']
+
+SQLITE_PRAGMAS = {              # werden bei jeder neuen SQLite-Verbindung gesetzt (market_app.db.apply_sqlite_pragmas)
+    'journal_mode': 'WAL',          # Leser und ein Schreiber blockieren sich nicht mehr gegenseitig
+    'synchronous': 'NORMAL',        # mit WAL sicher und deutlich schneller als FULL
+    'busy_timeout': 5000,           # Millisekunden warten statt sofort "database is locked"
+    'mmap_size': 268435456,         # 256 MB per Memory-Mapping lesen
+    'cache_size': -65536,           # 64 MB Page-Cache pro Verbindung (negativ = KiB)
+    'temp_store': 'MEMORY',
+}
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'market_app.api.pagination.IdCursorPagination',    # alle Listen werden per Cursor (id) seitenweise ausgeliefert
+    'PAGE_SIZE': 50,
+    'DEFAULT_RENDERER_CLASSES': [       # nutzt orjson, falls installiert (pip install orjson), sonst das json-Modul
+        'market_app.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'market_app.api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_RATES': {         # Kosten (= ausgelieferte Zeilen) pro Client und Zeitfenster, siehe market_app/api/throttling.py
+        'products': '30000/min',
+        'sellers': '30000/min',
+        'market_sellers': '10000/min',
+        'markets': '10000/min',
+    },
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Für mehrere Worker einen gemeinsamen Cache verwenden, z.B.:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/var/tmp/supermarket_cache'
+#   'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'api_cache'   (vorher: python manage.py createcachetable)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'supermarket',
+    },
+}
+
+API_CACHE_ALIAS = 'default'     # welcher Cache für die Detail-Views (Market, Seller, Product) verwendet wird
+API_CACHE_TIMEOUT = 300         # Sekunden, die ein Eintrag maximal gültig ist (wird bei Änderungen sofort per Signal ungültig)
+API_THROTTLE_DATABASE = os.path.join(tempfile.gettempdir(), 'supermarket_throttle.sqlite3')     # Zähler von market_app.api.throttling.CostRateThrottle (von allen Worker-Prozessen gemeinsam genutzt)
+
+
+# Messung pro Request (market_app.middleware.RequestTimingMiddleware): Server-Timing Header und eine JSON-Zeile im Logger "market_app.timing"
+# (INFO pro Request, WARNING wenn dasselbe SQL mehrfach ausgeführt wurde)
+
+REQUEST_TIMING_SAMPLE_RATE = 1.0            # Anteil der gemessenen Requests (in Produktion z.B. 0.05)
+REQUEST_TIMING_DUPLICATE_THRESHOLD = 2      # ab so vielen gleichen SQL-Abfragen in einem Request wird gewarnt (N+1)
+
+
+# Histogramme für /metrics (market_app.metrics): mit mehreren Worker-Prozessen (z.B. gunicorn --workers 4) ein gemeinsames,
+# beim Start leeres Verzeichnis angeben, in das jeder Prozess seine Werte schreibt
+
+METRICS_DIR = os.environ.get('METRICS_DIR')      # None = nur der eigene Prozess
+METRICS_FLUSH_INTERVAL = 5.0                      # Sekunden zwischen dem Schreiben der Datei eines Prozesses
+
+
+# Server-Sent Events unter /api/events/ (market_app.api.events, nur unter ASGI): ein Task pro Prozess liest das Änderungsprotokoll
+# (market_app.changes) und verteilt die Änderungen an alle verbundenen Clients
+
+CHANGE_EVENTS_POLL_INTERVAL = 1.0       # Sekunden zwischen zwei Abfragen des Änderungsprotokolls (nur solange Clients verbunden sind)
+CHANGE_EVENTS_KEEPALIVE = 15.0          # nach so vielen Sekunden ohne Änderung wird ein Kommentar gesendet (hält Proxies/ Load Balancer offen)
+CHANGE_EVENTS_QUEUE_SIZE = 1000         # so viele Events darf ein langsamer Client zurückliegen, danach wird er getrennt (und holt per Last-Event-ID nach)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 